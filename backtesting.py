@@ -0,0 +1,126 @@
+'''
+This module implements rolling-origin (walk-forward) backtesting. The series is turned into a single design matrix of
+sliding windows (see preprocessing.window_matrices). Each fold trains a fresh model on the rows before its forecast
+origin and scores its forecasts on the rows after that origin. All the folds slice the same design matrix, which is a
+view of the series, so the windows are only computed once however many folds there are.
+'''
+
+import numpy as np
+
+import modelingAndForecasting as mf
+import visualization as vs
+from preprocessing import window_matrices
+from tree import make_executor
+
+
+def rolling_origin_folds(n_rows, n_folds=5, test_size=None, output_index=1, mode="expanding", train_size=None):
+    '''
+    Computes the rows of rolling-origin folds over a design matrix. The test rows of the folds are consecutive blocks
+    ending with the last row. Training rows stop output_index - 1 rows before the origin, so no training target is a
+    value the fold forecasts.
+
+    ARGS:
+        - n_rows: number of rows of the design matrix
+        - n_folds: number of folds. Default 5.
+        - test_size: number of test rows of each fold. Default None (n_rows // (n_folds + 1)).
+        - output_index: number of output values of a row, see preprocessing.window_matrices. Default 1.
+        - mode: "expanding" (training starts at the first row) or "sliding" (training uses the last train_size rows
+                before the origin). Default "expanding".
+        - train_size: number of training rows of sliding folds. Default None (as many as the first fold has).
+
+    RETURNS:
+        - a list of (train slice, test slice) pairs, oldest fold first
+
+    RAISES:
+        - ValueError: if mode is unknown or there are too few rows for the folds
+    '''
+    if mode not in ("expanding", "sliding"):
+        raise ValueError(f"Unknown backtesting mode {mode}, expected 'expanding' or 'sliding'")
+    if test_size is None:
+        test_size = n_rows // (n_folds + 1)
+    first_origin = n_rows - n_folds * test_size
+    first_end = first_origin - output_index + 1
+    if test_size < 1 or first_end < 1:
+        raise ValueError(f"{n_rows} rows are too few for {n_folds} folds of {test_size} test rows")
+    if train_size is None:
+        train_size = first_end
+
+    folds = []
+    for fold in range(n_folds):
+        origin = first_origin + fold * test_size
+        end = origin - output_index + 1
+        start = 0 if mode == "expanding" else max(end - train_size, 0)
+        folds.append((slice(start, end), slice(origin, origin + test_size)))
+    return folds
+
+
+def _run_fold(model, model_args, x_train, y_train, x_test, y_test, metrics):
+    '''
+    Trains a fresh model on one fold and scores its forecasts.
+
+    RETURNS:
+        - a dict mapping metric names to scores
+    '''
+    trained_model = mf.fit(model(*model_args), x_train, y_train)
+    y_forecast = mf.predict(trained_model, x_test)
+    return {metric.__name__: metric(y_test, y_forecast) for metric in metrics}
+
+
+def backtest(ts, model, input_index, output_index=1, n_folds=5, test_size=None, mode="expanding", train_size=None,
+             metrics=(vs.mse,), model_args=(), executor=None, max_workers=None, dtype=None):
+    '''
+    Evaluates a model on the last column of a time series with rolling-origin folds, see rolling_origin_folds.
+
+    ARGS:
+        - ts: preprocessed TimeSeries
+        - model: function returning a fresh model, e.g. mf.rf_model or mf.mlp_model
+        - input_index: number of input values of a row, as for ts2db
+        - output_index: number of output values of a row. Default 1.
+        - n_folds, test_size, mode, train_size: see rolling_origin_folds
+        - metrics: functions scoring y_test against the forecast. Default (vs.mse,).
+        - model_args: args passed to model. Default ().
+        - executor: "thread", "process" or a concurrent.futures.Executor running the folds at the same time, see
+                    TransformationTree.execute_tree. Threads share the design matrix, while processes receive a copy
+                    of their fold's rows. Default None (sequential).
+        - max_workers: size of the pool created for executor. Default None.
+        - dtype: optional dtype of the design matrix, e.g. np.float32. Default None.
+
+    RETURNS:
+        - a list with one dict per fold, oldest first, holding the fold's number ("fold"), its (start, stop) training
+          and test rows ("train", "test") and the score of every metric by name
+    '''
+    values = ts.data[ts.data.columns[-1]].to_numpy()
+    x, y = window_matrices(values, input_index, output_index, dtype)
+    folds = rolling_origin_folds(len(x), n_folds, test_size, output_index, mode, train_size)
+    tasks = [(model, model_args, x[train], y[train], x[test], y[test], metrics) for train, test in folds]
+
+    if executor is None:
+        scores = [_run_fold(*task) for task in tasks]
+    else:
+        pool, owns_pool = make_executor(executor, max_workers)
+        try:
+            scores = list(pool.map(_run_fold, *zip(*tasks)))
+        finally:
+            if owns_pool:
+                pool.shutdown()
+
+    return [{"fold": fold, "train": (train.start, train.stop), "test": (test.start, test.stop), **score}
+            for fold, ((train, test), score) in enumerate(zip(folds, scores))]
+
+
+def summarize(results):
+    '''
+    Aggregates the scores of backtest folds.
+
+    ARGS:
+        - results: list returned by backtest
+
+    RETURNS:
+        - a dict mapping metric names to (mean, standard deviation) of their scores over the folds
+    '''
+    names = [name for name in results[0] if name not in ("fold", "train", "test")] if results else []
+    summary = {}
+    for name in names:
+        scores = np.array([result[name] for result in results], dtype=float)
+        summary[name] = (float(scores.mean()), float(scores.std()))
+    return summary
@@ -0,0 +1,249 @@
+'''
+This file benchmarks the preprocessing methods, design matrix creation, models, error metrics and a demo.py style
+transformation tree on the bundled datasets (and optional synthetic series scaled up to millions of rows).
+Results are written as JSON and can be compared against a stored baseline to flag regressions.
+
+Example usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.25
+    python benchmark.py --synthetic 1000000 5000000 --skip-models
+'''
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import ts_analysis_support as tsas
+
+TimeSeries = tsas.preprocessing.TimeSeries
+mf = tsas.modelingAndForecasting
+vs = tsas.visualization
+
+DATA_DIRS = ["data/Time Series Data", "data/Time Series Data 2"]
+# Models are only fitted on the last MODEL_ROWS training rows of a dataset, so a benchmark run stays in the range of minutes
+MODEL_ROWS = 2000
+
+
+def synthetic_series(n_rows, seed=0, missing=0.001):
+    '''
+    Generates a noisy seasonal time series with a few missing values.
+
+    ARGS:
+        - n_rows: number of rows
+        - seed: seed of the random generator. Default 0.
+        - missing: fraction of values replaced by NaN. Default 0.001.
+
+    RETURNS:
+        - a TimeSeries with a single "value" column
+    '''
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_rows, dtype=float)
+    values = 10 + np.sin(t * 2 * np.pi / 1440) * 5 + np.sin(t * 2 * np.pi / 60) + rng.normal(0, 0.5, n_rows)
+    values[rng.random(n_rows) < missing] = np.nan
+    return TimeSeries(pd.DataFrame({"value": values}))
+
+
+def _copy(ts):
+    return TimeSeries(ts.data.copy())
+
+
+def _split(ts):
+    ts = _copy(ts)
+    ts.split_data(.8, .1, .1)
+    return ts
+
+
+def _design(ts, input_index=10):
+    x_train, y_train, x_test, y_test = _copy(ts).ts2db(None, .8, .1, .1, input_index, 1, None)
+    return x_train[-MODEL_ROWS:], y_train[-MODEL_ROWS:], x_test, y_test
+
+
+def _fitted(model, ts):
+    x_train, y_train, x_test, y_test = _design(ts)
+    return mf.fit(model, x_train, y_train), x_test
+
+
+def _demo_tree(file_name):
+    t = tsas.tree.TransformationTree(tsas.operatorkeys.operator_input_keys, tsas.operatorkeys.operator_output_keys,
+                                     tsas.operatorkeys.operator_inplace_keys)
+    read = t.add_operator(TimeSeries.read_from_file, [file_name], t.root)
+    denoise = t.add_operator(TimeSeries.denoise, [], read)
+    ts2db = t.add_operator(TimeSeries.ts2db, [None, 0.8, 0.1, 0.1, 2, 1, None], denoise, tag="db")
+    model = t.add_operator(mf.rf_model, [], ts2db)
+    fit = t.add_operator(mf.fit, [], model)
+    predict = t.add_operator(mf.predict, [], fit)
+    t.add_operator(vs.mse, [], predict, save_result=True)
+    for i in range(3):
+        replica = t.replicate_subtree(ts2db, tag_modifier=f"_{i}")
+        t.replace_operator(TimeSeries.ts2db, [None, 0.8, 0.1, 0.1, 3 + i, 1, None], replica)
+    return t
+
+
+# Each benchmark is (name, prepare, run, needs_models): prepare(ts, file_name) builds the arguments outside of the
+# timed region, run(*arguments) is timed
+BENCHMARKS = [
+    ("read_from_file", lambda ts, f: (f,), lambda f: TimeSeries().read_from_file(f), False),
+    ("assign_time", lambda ts, f: (_copy(ts),), lambda ts: ts.assign_time("01/01/2000 00:00", 1), False),
+    ("impute_missing", lambda ts, f: (_copy(ts),), lambda ts: ts.impute_missing(), False),
+    ("impute_outliers", lambda ts, f: (_copy(ts),), lambda ts: ts.impute_outliers(), False),
+    ("impute_outliers_approximate", lambda ts, f: (_copy(ts),), lambda ts: ts.impute_outliers(approximate=True), False),
+    ("impute_outliers_winsorize", lambda ts, f: (_copy(ts),), lambda ts: ts.impute_outliers(winsorize=True), False),
+    ("denoise", lambda ts, f: (_copy(ts),), lambda ts: ts.denoise(), False),
+    ("difference", lambda ts, f: (ts,), lambda ts: ts.difference(), False),
+    ("longest_continuous_run", lambda ts, f: (ts,), lambda ts: ts.longest_continuous_run(), False),
+    ("scaling", lambda ts, f: (ts,), lambda ts: ts.scaling(), False),
+    ("standardize", lambda ts, f: (ts,), lambda ts: ts.standardize(), False),
+    ("logarithm", lambda ts, f: (ts,), lambda ts: ts.logarithm(), False),
+    ("cubic_root", lambda ts, f: (ts,), lambda ts: ts.cubic_root(), False),
+    ("design_matrix", lambda ts, f: (_split(ts),), lambda ts: ts.design_matrix(10, 1), False),
+    ("ts2db", lambda ts, f: (_copy(ts),), lambda ts: ts.ts2db(None, .8, .1, .1, 10, 1, None), False),
+    ("mse", lambda ts, f: _design(ts)[2:], lambda x, y: vs.mse(y, y[::-1]), False),
+    ("mape", lambda ts, f: _design(ts)[2:], lambda x, y: vs.mape(y, y[::-1]), False),
+    ("smape", lambda ts, f: _design(ts)[2:], lambda x, y: vs.smape(y, y[::-1]), False),
+    ("mlp_fit", lambda ts, f: (mf.mlp_model(10, 1, 3),) + _design(ts)[:2], mf.fit, True),
+    ("mlp_predict", lambda ts, f: _fitted(mf.mlp_model(10, 1, 3), ts), mf.predict, True),
+    ("rf_fit", lambda ts, f: (mf.rf_model(),) + _design(ts)[:2], mf.fit, True),
+    ("rf_predict", lambda ts, f: _fitted(mf.rf_model(), ts), mf.predict, True),
+    ("demo_tree", lambda ts, f: (_demo_tree(f),), lambda t: t.execute_tree(), True),
+]
+
+
+def time_call(prepare, run, ts, file_name, repeat):
+    '''
+    Times a benchmark, preparing fresh arguments before every repetition.
+
+    RETURNS:
+        - the fastest of the repetitions in seconds
+    '''
+    timings = []
+    for _ in range(repeat):
+        arguments = prepare(ts, file_name)
+        start = time.perf_counter()
+        run(*arguments)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def load_datasets(data_dirs, synthetic_rows, tmp_dir):
+    '''
+    Loads the bundled datasets and generates the synthetic ones. Synthetic series are written to tmp_dir so that
+    read_from_file and the demo tree can be benchmarked on them too.
+
+    RETURNS:
+        - a list of (dataset name, file name, TimeSeries) tuples
+    '''
+    datasets = []
+    for data_dir in data_dirs:
+        for file_name in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+            ts = TimeSeries().read_from_file(file_name)
+            name = f"{os.path.basename(data_dir)}/{os.path.basename(file_name)}"
+            datasets.append((name, file_name, ts))
+    for n_rows in synthetic_rows:
+        ts = synthetic_series(n_rows)
+        file_name = os.path.join(tmp_dir, f"synthetic_{n_rows}.csv")
+        if not os.path.exists(file_name):
+            os.makedirs(tmp_dir, exist_ok=True)
+            ts.data.to_csv(file_name, index=False)
+        datasets.append((f"synthetic/{n_rows}", file_name, ts))
+    return datasets
+
+
+def run_benchmarks(datasets, repeat=3, name_filter=None, skip_models=False):
+    '''
+    Runs every benchmark on every dataset. A benchmark that raises on a dataset (e.g. the logarithm of negative
+    values or a dataset too short for ts2db) is recorded as an error instead of a timing.
+
+    RETURNS:
+        - a dict mapping "dataset::benchmark" to {"seconds": float, "rows": int} or {"error": str}
+    '''
+    results = {}
+    for dataset_name, file_name, ts in datasets:
+        for name, prepare, run, needs_models in BENCHMARKS:
+            if (skip_models and needs_models) or (name_filter and name_filter not in name):
+                continue
+            key = f"{dataset_name}::{name}"
+            try:
+                # The preprocessing methods print their results, which would dominate the timings
+                with contextlib.redirect_stdout(io.StringIO()):
+                    seconds = time_call(prepare, run, ts, file_name, repeat)
+                results[key] = {"seconds": seconds, "rows": len(ts.data)}
+            except Exception as error:
+                results[key] = {"error": f"{type(error).__name__}: {error}"}
+            print(f"{key:<80} {results[key].get('seconds', results[key].get('error'))}", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Compares timings against a baseline run.
+
+    ARGS:
+        - results: dict returned by run_benchmarks
+        - baseline: "results" dict of a previous run
+        - tolerance: allowed relative slowdown, e.g. 0.2 for 20%
+
+    RETURNS:
+        - a list of (key, baseline seconds, current seconds) of the benchmarks slower than the tolerance allows
+    '''
+    regressions = []
+    for key, result in results.items():
+        old = baseline.get(key, {})
+        if "seconds" in result and "seconds" in old and result["seconds"] > old["seconds"] * (1 + tolerance):
+            regressions.append((key, old["seconds"], result["seconds"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the time series library on the bundled datasets")
+    parser.add_argument("--data-dir", action="append", help="directory of csv files (repeatable)")
+    parser.add_argument("--synthetic", type=int, nargs="*", default=[], help="row counts of synthetic series to add")
+    parser.add_argument("--tmp-dir", default=os.path.join(tempfile.gettempdir(), "ts_bench_data"), help="where synthetic csv files are written")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per benchmark, the fastest is kept")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--skip-models", action="store_true", help="skip model fitting and the demo tree")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (default 0.2)")
+    args = parser.parse_args(argv)
+
+    datasets = load_datasets(args.data_dir or DATA_DIRS, args.synthetic, args.tmp_dir)
+    results = run_benchmarks(datasets, args.repeat, args.filter, args.skip_models)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "repeat": args.repeat,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for key, old, new in regressions:
+            print(f"REGRESSION {key}: {old:.6f}s -> {new:.6f}s ({new / old - 1:+.0%})")
+        if regressions:
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+'''
+This module implements a content-addressed cache for the results of transformation tree nodes. Entries are keyed by
+a digest of the operator, its args and the digests of its input values, so re-executing a tree only recomputes the
+nodes whose inputs or arguments changed.
+'''
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+def operator_name(operator):
+    '''
+    Returns a name identifying an operator function across processes and executions.
+
+    ARGS:
+        operator: the operator function (or class) of a Node
+
+    RETURNS:
+        a string of the form "module.qualified_name"
+    '''
+    return f"{getattr(operator, '__module__', '')}.{getattr(operator, '__qualname__', repr(operator))}"
+
+
+def node_digest(operator, args, input_digests):
+    '''
+    Computes the content address of a node execution.
+
+    ARGS:
+        operator: the operator function being applied
+        args: the positional args passed to the operator. String args naming an existing file also include the file's
+              size and modification time, so editing an input file invalidates the nodes reading it.
+        input_digests: digests of the values taken from the branch dictionary
+
+    RETURNS:
+        a hex digest string
+    '''
+    file_stats = []
+    for arg in args:
+        if isinstance(arg, str) and os.path.isfile(arg):
+            stat = os.stat(arg)
+            file_stats.append((arg, stat.st_size, stat.st_mtime_ns))
+    try:
+        arg_bytes = pickle.dumps(args, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        arg_bytes = repr(args).encode()
+    sha = hashlib.sha256()
+    sha.update(operator_name(operator).encode())
+    sha.update(arg_bytes)
+    sha.update(repr(file_stats).encode())
+    for digest in input_digests:
+        sha.update(digest.encode())
+    return sha.hexdigest()
+
+
+def value_digest(digest, key):
+    '''
+    Derives the digest of a value stored in the branch dictionary by the node with the given digest.
+
+    ARGS:
+        digest: digest of the node that created or modified the value
+        key: branch dictionary key of the value
+
+    RETURNS:
+        a hex digest string
+    '''
+    return hashlib.sha256(f"{digest}:{key}".encode()).hexdigest()
+
+
+class ResultCache:
+    '''
+    Two-tier LRU cache of pickled node outputs. The in-memory tier is bounded by number of entries and bytes, and the
+    optional on-disk tier (a directory of pickle files) is bounded by bytes. Entries are stored pickled, so cached
+    values can't be modified by the operators that run after them.
+    '''
+    def __init__(self, max_entries=128, max_bytes=None, directory=None, max_disk_bytes=None):
+        '''
+        ARGS:
+            max_entries: maximum number of entries kept in memory. Default 128.
+            max_bytes: maximum total size in bytes of the entries kept in memory. Default None (no limit).
+            directory: directory used for the on-disk tier. Default None (memory only).
+            max_disk_bytes: maximum total size in bytes of the on-disk tier. Default None (no limit).
+        '''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, digest):
+        '''
+        Looks up an entry, promoting it to most recently used.
+
+        ARGS:
+            digest: content address of the entry
+
+        RETURNS:
+            the pickled entry as bytes, or None if it isn't cached
+        '''
+        with self._lock:
+            blob = self._entries.get(digest)
+            if blob is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return blob
+        blob = self._read_disk(digest)
+        with self._lock:
+            if blob is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._put_memory(digest, blob)
+        return blob
+
+    def put(self, digest, blob, disk=True):
+        '''
+        Stores an entry in memory and on disk, evicting the least recently used entries when over the limits.
+
+        ARGS:
+            digest: content address of the entry
+            blob: the pickled entry as bytes
+            disk: whether the entry is also written to the on-disk tier. Default True.
+        '''
+        with self._lock:
+            self._put_memory(digest, blob)
+        if disk and self.directory is not None:
+            self._write_disk(digest, blob)
+
+    def invalidate(self, digest):
+        '''
+        Removes a single entry from both tiers.
+
+        ARGS:
+            digest: content address of the entry
+        '''
+        with self._lock:
+            blob = self._entries.pop(digest, None)
+            if blob is not None:
+                self._size -= len(blob)
+        if self.directory is not None:
+            try:
+                os.remove(self._path(digest))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        '''
+        Removes every entry from both tiers.
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.directory is not None:
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, file_name))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        # Worker processes get an empty memory tier and share only the on-disk tier. The tree sends them the entries
+        # they need along with their work, and stores the entries they compute in the parent process
+        state = self.__dict__.copy()
+        state["_entries"] = OrderedDict()
+        state["_size"] = 0
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _put_memory(self, digest, blob):
+        old_blob = self._entries.pop(digest, None)
+        if old_blob is not None:
+            self._size -= len(old_blob)
+        if self.max_bytes is not None and len(blob) > self.max_bytes:
+            return
+        self._entries[digest] = blob
+        self._size += len(blob)
+        while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._size > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.pkl")
+
+    def _read_disk(self, digest):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(digest), 'rb') as file:
+                blob = file.read()
+            # The modification time doubles as the last access time used for eviction
+            os.utime(self._path(digest))
+            return blob
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, digest, blob):
+        # Writing to a temporary name first keeps other processes from reading a partial file
+        temp_path = f"{self._path(digest)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(blob)
+        os.replace(temp_path, self._path(digest))
+        if self.max_disk_bytes is not None:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".pkl"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, file_name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, file_name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, file_name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                pass
+            total -= size
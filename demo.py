@@ -11,7 +11,8 @@ import ts_analysis_support as tsas
 filename = "data/Time Series Data/1_temperature_test.csv"
 
 def main():
-    t = tsas.tree.TransformationTree(tsas.operatorkeys.operator_input_keys, tsas.operatorkeys.operator_output_keys)
+    t = tsas.tree.TransformationTree(tsas.operatorkeys.operator_input_keys, tsas.operatorkeys.operator_output_keys,
+                                     tsas.operatorkeys.operator_inplace_keys)
     # Creating a single branch
     read = t.add_operator(tsas.preprocessing.TimeSeries.read_from_file, [filename], t.root, tag="read")
     assign_time = t.add_operator(tsas.preprocessing.TimeSeries.assign_time, ["01/01/2000 12:30", 24], read)
@@ -47,6 +48,11 @@ def main():
     sorted_results = sorted(t.results, key=lambda x: x[0])
     best_branch = sorted_results[0]
     print(f"Best MSE: {best_branch[0]}, from branch: {t.get_path_str(best_branch[1])}")
+
+    # The same search as a sweep: the ts2db operator is executed with every input_index (its argument at position 4)
+    # in virtual branches, without replicating any node
+    best, records = t.sweep(ts2db_operator, {4: list(range(2, 13))})
+    print(f"Best MSE: {best['score']}, from input_index: {best['args'][4]}")
     
 
 main()
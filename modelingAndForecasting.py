@@ -8,8 +8,13 @@ Most recent modification: 2/9/21
 from sklearn.neural_network import MLPRegressor
 from sklearn.ensemble import RandomForestRegressor
 from preprocessing import TimeSeries
+from copy import deepcopy
+import threading
 import numpy as np
 
+# Parameters that don't change what a trained model looks like, or that warm starting changes itself
+_WARM_START_IGNORED = ("warm_start", "n_estimators", "max_iter", "verbose", "n_jobs")
+
 def mlp_model(input_dimension=100, output_dimension=1, layers=10):
     '''
     Wrapper function for multilayer perceptron model.
@@ -45,7 +50,67 @@ def rf_model():
     '''
     return RandomForestRegressor()
 
-def fit(model, x_train, y_train):
+class ModelRegistry:
+    '''
+    Keeps the most recently trained model of each kind, for fit(..., warm_start=registry). A registry is shared by the
+    branches and executions it's passed to, e.g. all the fit nodes of one tree, and by nothing else.
+
+    Deep copies share the registry instead of copying it, so the fit nodes of a subtree replicated with
+    TransformationTree.replicate_subtree warm start from each other. A registry is pickled with its models, so worker
+    processes of the "process" executor start from the models it held when their branch was submitted, and the models
+    they train are not added back. Since the tree's result cache pickles a node's args to address its output, a fit's
+    cached result is only reused while the registry holds the same models as when it was computed. A cache hit doesn't
+    add its model to the registry.
+    '''
+    def __init__(self):
+        # _warm_start_key -> trained model
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        Parameters
+        ----------
+            - key: key of the model, from _warm_start_key
+
+        Returns
+        -------
+            - The most recently stored model with that key, or None
+        '''
+        with self._lock:
+            return self._models.get(key)
+
+    def put(self, key, model):
+        '''
+        Parameters
+        ----------
+            - key: key of the model, from _warm_start_key
+            - model: trained model object
+        '''
+        with self._lock:
+            self._models[key] = model
+
+    def clear(self):
+        '''
+        Forgets every model, so the next fits start from scratch.
+        '''
+        with self._lock:
+            self._models.clear()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def fit(model, x_train, y_train, warm_start=None):
     '''
     Wrapper function for fit methods of RandomForestRegressor and MLPRegressor objects
 
@@ -54,13 +119,84 @@ def fit(model, x_train, y_train):
         - model: RandomForestRegressor or MLPRegressor object
         - x_train: training input data, derived from ts2db
         - y_train: training output data, derived from ts2db
+        - warm_start: (optional) ModelRegistry to start from. Training starts from the last model stored in it with the
+                      same type, parameters and number of features, e.g. by a replicated branch or a previous execution
+                      of the tree, and the trained model is stored in it. An MLP continues training from its weights,
+                      and a random forest keeps most of its trees and replaces the oldest with new trees (see update).
+                      model itself is only trained when there is no such model yet. Branches with a different
+                      input_index have a different number of features, so they never share a model. See ModelRegistry
+                      for how it works with the "process" executor and the result cache. Default None (train model
+                      from scratch).
 
     Returns
     -------
         - Trained model object
     '''
     y_train_array = np.ravel(y_train)
-    return model.fit(x_train, y_train_array)
+    if warm_start is None or warm_start is False:
+        return model.fit(x_train, y_train_array)
+    if not isinstance(warm_start, ModelRegistry):
+        raise TypeError(f"warm_start must be a ModelRegistry, got {warm_start!r}")
+
+    key = _warm_start_key(model, x_train)
+    previous = warm_start.get(key)
+    if isinstance(previous, RandomForestRegressor):
+        trained_model = update(deepcopy(previous), x_train, y_train_array)
+    elif isinstance(previous, MLPRegressor):
+        trained_model = deepcopy(previous)
+        trained_model.warm_start = True
+        # The stopping criterion starts over on the new data, otherwise it would stop after a single iteration
+        trained_model._no_improvement_count = 0
+        if trained_model.early_stopping:
+            trained_model.best_validation_score_ = -np.inf
+        else:
+            trained_model.best_loss_ = np.inf
+        trained_model.fit(x_train, y_train_array)
+    else:
+        trained_model = model.fit(x_train, y_train_array)
+    warm_start.put(key, trained_model)
+    return trained_model
+
+
+def update(model, x_new, y_new, n_estimators=None):
+    '''
+    Trains an already trained model on new data only, e.g. the rows appended since it was trained (see
+    Pipeline.push), instead of refitting it on the whole history.
+
+    Parameters
+    ----------
+        - model: trained RandomForestRegressor or MLPRegressor object
+        - x_new: new input data, derived from ts2db
+        - y_new: new output data, derived from ts2db
+        - n_estimators: (optional) for a random forest, the number of new trees grown on the new data. As many of the
+                        oldest trees are dropped, so the forest keeps its size. Default None (a quarter of the trees).
+
+    Returns
+    -------
+        - The updated model object. An MLP makes one partial_fit pass over the new data. Other models are refit on
+          the new data.
+    '''
+    y_new_array = np.ravel(y_new)
+    if isinstance(model, MLPRegressor):
+        return model.partial_fit(x_new, y_new_array)
+    if not isinstance(model, RandomForestRegressor):
+        return model.fit(x_new, y_new_array)
+
+    if np.shape(x_new)[1] != model.n_features_in_:
+        raise ValueError(f"The forest was trained on {model.n_features_in_} features, got {np.shape(x_new)[1]}")
+    n_new = n_estimators or max(model.n_estimators // 4, 1)
+    model.warm_start = True
+    model.n_estimators += n_new
+    model.fit(x_new, y_new_array)
+    model.estimators_ = model.estimators_[n_new:]
+    model.n_estimators -= n_new
+    return model
+
+
+def _warm_start_key(model, x_train):
+    params = model.get_params()
+    settings = tuple(sorted((name, repr(value)) for name, value in params.items() if name not in _WARM_START_IGNORED))
+    return type(model), settings, np.shape(x_train)[1]
 
 def predict(model, X):
     '''
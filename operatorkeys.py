@@ -10,6 +10,7 @@ Most recent modification: 2/4/21
 import preprocessing
 import modelingAndForecasting as mf
 import visualization as vs
+import backtesting
 
 # Dictionary for the input keys
 operator_input_keys = {
@@ -28,14 +29,26 @@ operator_input_keys = {
     preprocessing.TimeSeries.standardize: ["timeseries_data"],
     preprocessing.TimeSeries.logarithm: ["timeseries_data"],
     preprocessing.TimeSeries.cubic_root: ["timeseries_data"],
+    preprocessing.TimeSeries.lazy_mode: ["timeseries_data"],
     preprocessing.TimeSeries.split_data: ["timeseries_data", "perc_training", "perc_valid", "perc_test"],
     preprocessing.TimeSeries.ts2db: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.read_from_files: [],
+    preprocessing.TimeSeriesBatch.select: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.impute_missing: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.impute_outliers: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.difference: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.scaling: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.standardize: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.logarithm: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.cubic_root: ["timeseries_data"],
 
     # Inputs for modelingAndForecasting component
     mf.mlp_model: [],
     mf.rf_model: [],
     mf.fit: ["model", "x_train", "y_train"],
     mf.predict: ["trained_model", "x_test"],
+    mf.update: ["trained_model", "x_train", "y_train"],
+    backtesting.backtest: ["timeseries_data"],
 
     # Inputs for visualization component
     vs.plot: ["timeseries_data"],
@@ -64,15 +77,27 @@ operator_output_keys = {
     preprocessing.TimeSeries.standardize: ["timeseries_data"],
     preprocessing.TimeSeries.logarithm: ["timeseries_data"],
     preprocessing.TimeSeries.cubic_root: ["timeseries_data"],
+    preprocessing.TimeSeries.lazy_mode: [],
     preprocessing.TimeSeries.split_data: [],
     preprocessing.TimeSeries.design_matrix: ["training_matrix", "test_matrix"],
     preprocessing.TimeSeries.ts2db: ["x_train", "y_train", "x_test", "y_test"],
+    preprocessing.TimeSeriesBatch.read_from_files: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.select: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.impute_missing: [],
+    preprocessing.TimeSeriesBatch.impute_outliers: [],
+    preprocessing.TimeSeriesBatch.difference: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.scaling: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.standardize: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.logarithm: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.cubic_root: ["timeseries_data"],
 
     # Outputs for the modelingAndForecasting component
     mf.mlp_model: ["model"],
     mf.rf_model: ["model"],
     mf.fit: ["trained_model"],
     mf.predict: ["y_forecast"],
+    mf.update: ["trained_model"],
+    backtesting.backtest: ["backtest_results"],
 
     # Outputs for the visualization component
     vs.plot: [],
@@ -83,3 +108,81 @@ operator_output_keys = {
     vs.mape: ["error_val"],
     vs.smape: ["error_val"]
 }
+
+# Dictionary declaring which input values an operator modifies in place.
+# The tree shares values between branches and only copies the ones listed here before running the operator.
+operator_inplace_keys = {
+    # The preprocessing methods below reassign or modify attributes of the TimeSeries they are called on
+    preprocessing.TimeSeries: [],
+    preprocessing.TimeSeries.read_from_file: ["timeseries_without_data"],
+    preprocessing.TimeSeries.write_to_file: [],
+    preprocessing.TimeSeries.assign_time: ["timeseries_data"],
+    preprocessing.TimeSeries.clip: [],
+    preprocessing.TimeSeries.denoise: ["timeseries_data"],
+    preprocessing.TimeSeries.impute_missing: ["timeseries_data"],
+    preprocessing.TimeSeries.difference: [],
+    preprocessing.TimeSeries.impute_outliers: ["timeseries_data"],
+    preprocessing.TimeSeries.longest_continuous_run: [],
+    preprocessing.TimeSeries.scaling: [],
+    preprocessing.TimeSeries.standardize: [],
+    preprocessing.TimeSeries.logarithm: [],
+    preprocessing.TimeSeries.cubic_root: [],
+    preprocessing.TimeSeries.lazy_mode: ["timeseries_data"],
+    preprocessing.TimeSeries.split_data: ["timeseries_data"],
+    preprocessing.TimeSeries.ts2db: [],
+    preprocessing.TimeSeriesBatch.read_from_files: [],
+    preprocessing.TimeSeriesBatch.select: [],
+    preprocessing.TimeSeriesBatch.impute_missing: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.impute_outliers: ["timeseries_data"],
+    preprocessing.TimeSeriesBatch.difference: [],
+    preprocessing.TimeSeriesBatch.scaling: [],
+    preprocessing.TimeSeriesBatch.standardize: [],
+    preprocessing.TimeSeriesBatch.logarithm: [],
+    preprocessing.TimeSeriesBatch.cubic_root: [],
+
+    # sklearn's fit trains the model object it's called on
+    mf.mlp_model: [],
+    mf.rf_model: [],
+    mf.fit: ["model"],
+    mf.predict: [],
+    mf.update: ["trained_model"],
+    backtesting.backtest: [],
+
+    vs.plot: [],
+    vs.histogram: [],
+    vs.box_plot: [],
+    vs.normality_test: [],
+    vs.mse: [],
+    vs.mape: [],
+    vs.smape: []
+}
+
+# Operators that spend their time reading or writing files rather than computing.
+# The tree's "async" executor runs them alongside the compute-bound operators.
+operator_io_bound = [
+    preprocessing.TimeSeries.read_from_file,
+    preprocessing.TimeSeries.write_to_file,
+    preprocessing.TimeSeriesBatch.read_from_files
+]
+
+# Dictionary declaring which inputs of an operator can be cut down to a subsample of their rows.
+# TransformationTree.successive_halving uses it to try branches with a small training budget first.
+operator_budget_keys = {
+    mf.fit: ["x_train", "y_train"],
+    mf.update: ["x_train", "y_train"]
+}
+
+# Dictionary declaring the operators whose model Pipeline.push updates with the new rows instead of running them again.
+# Values are (update function, input keys) pairs: the function is called with the model trained so far followed by the
+# values of the input keys.
+operator_update_functions = {
+    mf.fit: (mf.update, ["x_train", "y_train"]),
+    mf.update: (mf.update, ["x_train", "y_train"])
+}
+
+# Dictionary declaring the operators that build the sliding windows of a time series (design matrices) from their
+# input_index and output_index args. Values are the output keys the windows are stored in, as (x, y) pairs.
+# Pipeline.push builds the windows ending in the new rows itself.
+operator_window_keys = {
+    preprocessing.TimeSeries.ts2db: ["x_train", "y_train", "x_test", "y_test"]
+}
@@ -8,96 +8,423 @@ Most recent modification: 2/9/21
 
 import pandas as pd
 import csv
+from copy import copy
 import matplotlib.pyplot as plt
-from datetime import date
-from datetime import datetime, date, timedelta
+from datetime import datetime
 import numpy as np
-import re
-import janitor  # need to install
+from pandas.tseries.frequencies import to_offset
+import os
+from sketch import QuantileSketch
+
+
+# binary formats supported by read_from_file and write_to_file
+_PARQUET = (".parquet",)
+_FEATHER = (".feather", ".arrow")
+_NPY = (".npy",)
+# name of the .npy field holding a non-default index (e.g. from assign_time)
+_NPY_INDEX = "__index__"
+
+
+def _binary_format(file_name):
+    """
+    :param file_name: name of a time series file
+    :return: the file's extension if it's a binary format, otherwise None
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension in _PARQUET + _FEATHER + _NPY:
+        return extension
+    return None
+
+
+def _read_binary(file_name, usecols=None):
+    """
+    Load a dataframe written by _write_binary. Feather and .npy files are
+    memory mapped: the pages are only read when used and are shared by
+    every process loading the same file.
+    :param file_name: name of a .parquet, .feather/.arrow or .npy file
+    :param usecols: optional list of the columns to load
+    :return: pandas DataFrame
+    """
+    extension = _binary_format(file_name)
+    if extension in _NPY:
+        records = np.load(file_name, mmap_mode="r")
+        names = [name for name in records.dtype.names
+                 if name != _NPY_INDEX and (usecols is None or name in usecols)]
+        # each column is a view of the memory mapped file
+        data = pd.DataFrame({name: records[name] for name in names},
+                            copy=False)
+        if _NPY_INDEX in records.dtype.names:
+            data.index = pd.Index(records[_NPY_INDEX])
+        return data
+
+    import pyarrow  # need to install for parquet and feather files
+    if extension in _PARQUET:
+        return pd.read_parquet(file_name, columns=usecols, memory_map=True)
+    from pyarrow import feather
+    table = feather.read_table(file_name, columns=usecols, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def _write_binary(data, file_name):
+    """
+    Write a dataframe in the binary format given by the file extension.
+    A non-default index is stored along with the columns.
+    :param data: pandas DataFrame
+    :param file_name: name of a .parquet, .feather/.arrow or .npy file
+    :return: void
+    """
+    extension = _binary_format(file_name)
+    if extension in _NPY:
+        keep_index = not isinstance(data.index, pd.RangeIndex)
+        if keep_index:
+            data = data.rename_axis(_NPY_INDEX).reset_index()
+        # strings are stored as fixed width fields so the file can be
+        # memory mapped (object fields would need pickle)
+        text_dtypes = {col: f"U{max(data[col].astype(str).str.len().max(), 1)}"
+                       for col in data.columns if data[col].dtype == object}
+        np.save(file_name, data.to_records(index=False,
+                                           column_dtypes=text_dtypes))
+        return
+
+    import pyarrow  # need to install for parquet and feather files
+    if extension in _PARQUET:
+        data.to_parquet(file_name)
+        return
+    from pyarrow import feather
+    # uncompressed so the file can be memory mapped when it's read back
+    feather.write_feather(pyarrow.Table.from_pandas(data), file_name,
+                          compression="uncompressed")
+
+
+def window_matrices(values, input_index, output_index, dtype=None):
+    """
+    Build the rows of a design matrix: each row holds input_index
+    consecutive values (x) and the output_index values that follow them
+    (y). The rows are read-only sliding-window views of values, so no
+    values are copied (except once when a dtype is given).
+    :param values: 1-D array of the series
+    :param input_index: number of input values in a row
+    :param output_index: number of output values in a row
+    :param dtype: optional dtype of the matrices, e.g. np.float32
+    :return: x, y as NumPy arrays
+    """
+    width = input_index + output_index
+    values = np.asarray(values, dtype=dtype)
+    if len(values) < width:
+        # not enough data for a single row
+        return np.empty((0, input_index), values.dtype), \
+            np.empty((0, output_index), values.dtype)
+    view = np.lib.stride_tricks.sliding_window_view(values, width)
+    return view[:, :input_index], view[:, input_index:]
+
+
+def _is_numeric(column):
+    """
+    :param column: pandas Series
+    :return: whether the preprocessing methods transform the column
+    """
+    return column.dtype == 'float64' or column.dtype == 'int64'
+
+
+def _owns_buffer(values):
+    """
+    :param values: NumPy array of a column
+    :return: whether the memory behind values holds nothing else, so
+        modifying it in place can't change another frame, e.g. the one a
+        slice was taken from or the other columns of a block
+    """
+    owner = values if values.base is None else values.base
+    return isinstance(owner, np.ndarray) and owner.flags.owndata and \
+        owner.nbytes == values.nbytes
+
+
+def _elementwise(operation, values, stats=None):
+    """
+    Apply an elementwise operation to a column in place
+    :param operation: "scaling", "standardize", "logarithm" or "cubic_root"
+    :param values: float64 NumPy array of the column
+    :param stats: the column's RunningStats in incremental mode, else None
+    :return: void
+    """
+    if len(values) == 0:
+        return
+    if operation == "logarithm":
+        np.log10(values, out=values)
+    elif operation == "cubic_root":
+        np.power(values, 1 / 3, out=values)
+    elif operation == "scaling":
+        if stats is not None:
+            low, high = stats.min, stats.max
+        else:
+            low, high = np.nanmin(values), np.nanmax(values)
+        values -= low
+        values /= high - low
+    elif operation == "standardize":
+        if stats is not None:
+            mean, std = stats.mean, stats.std
+        else:
+            mean, std = np.nanmean(values), np.nanstd(values, ddof=1)
+        values -= mean
+        values /= std
+    else:
+        raise ValueError(f"Unknown elementwise operation {operation}")
+
+
+class RunningStats:
+    """
+    Count, mean, variance, min, max and quantile sketch of a column,
+    updated one batch of values at a time. Batches are combined with the
+    parallel variance formula of Chan et al., so the values themselves
+    don't have to be kept. NaNs are ignored, like pandas does.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch()
+
+    def update(self, values):
+        """
+        Add a batch of values to the statistics
+        :param values: array or Series of numbers
+        :return: self
+        """
+
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+
+        mean = values.mean()
+        m2 = np.square(values - mean).sum()
+        count = self.count + len(values)
+        delta = mean - self.mean
+        self.mean += delta * len(values) / count
+        self.m2 += m2 + delta ** 2 * self.count * len(values) / count
+        self.count = count
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.sketch.update(values)
+        return self
+
+    @property
+    def std(self):
+        """
+        :return: sample standard deviation, like pandas.Series.std
+        """
+        if self.count < 2:
+            return np.nan
+        return np.sqrt(self.m2 / (self.count - 1))
+
+    def quantile(self, q):
+        """
+        :param q: quantile or list of quantiles between 0 and 1
+        :return: approximate quantile(s) of every value seen so far
+        """
+        return self.sketch.quantile(q)
 
 
 class TimeSeries:
 
-    def __init__(self, df=None):
+    def __init__(self, df=None, lazy=False):
+        self._pending = []  # elementwise operations not applied yet
+        self._times = None  # sorted timestamps, see _time_index
+        self.lazy = lazy  # see lazy_mode
         self.data = None  # holds data from initial csv read
         if type(df) == pd.core.frame.DataFrame:
             self.data = df
+        self.stats = None  # column -> RunningStats, see track_stats
+        self.tail = None  # last row before self.data, see append
+        self.offset = 0  # number of rows before self.data, see append
         # self.clipped = None  # holds data from a clipped interval
         # self.temp = None  # for impute missing
         # self.dif = None   # for calculating difference
 
-    def read_from_file(self, file_name: str):
+    @property
+    def data(self):
+        """
+        :return: the DataFrame, after applying the pending elementwise
+            operations of lazy mode
+        """
+        if self._pending:
+            self._materialize()
+        return self._data
+
+    @data.setter
+    def data(self, df):
+        self._data = df
+        self._pending = []
+        self._times = None  # see _time_index
+
+    def __setstate__(self, state):
+        # time series pickled before data became a property
+        if "data" in state:
+            state["_data"] = state.pop("data")
+        for name, value in (("_pending", []), ("lazy", False), ("stats", None),
+                            ("tail", None), ("offset", 0), ("_times", None)):
+            state.setdefault(name, value)
+        self.__dict__.update(state)
+
+    def read_from_file(self, file_name: str, usecols=None, dtype=None,
+                       parse_dates=None):
         """
         Read from a CSV file and create a Pandas dataframe
+        Files ending in .parquet, .feather/.arrow or .npy (as written by
+        write_to_file) are loaded from their binary format instead, memory
+        mapped where the format allows it
         :param file_name: name of the csv file to open
+        :param usecols: optional list of the columns to keep, the others
+            are skipped while parsing
+        :param dtype: optional dtype, or dict of column -> dtype, of the
+            columns (e.g. {"Value": "float32"}), skips type inference
+        :param parse_dates: optional list of columns parsed as dates,
+            passed to pandas.read_csv
         :return: a time series
         """
 
         try:
-            self.data = pd.read_csv(file_name)
+            if _binary_format(file_name):
+                self.data = _read_binary(file_name, usecols)
+            else:
+                self.data = pd.read_csv(file_name, usecols=usecols,
+                                        dtype=dtype, parse_dates=parse_dates,
+                                        memory_map=True)
         except FileNotFoundError:
             print(f"File {file_name} not found.")
 
         return self
 
+    @classmethod
+    def read_chunks(cls, file_name: str, chunksize: int, usecols=None,
+                    dtype=None, parse_dates=None):
+        """
+        Read a CSV file in fixed-size chunks, so files larger than memory
+        can be preprocessed one chunk at a time, e.g.
+        for ts in TimeSeries.read_chunks(name, 100000): ts.impute_missing()
+        Only one chunk is held in memory at a time.
+        :param file_name: name of the csv file to open
+        :param chunksize: number of rows in each chunk
+        :param usecols: see read_from_file
+        :param dtype: see read_from_file
+        :param parse_dates: see read_from_file
+        :return: generator of TimeSeries, one per chunk
+        """
+
+        try:
+            reader = pd.read_csv(file_name, chunksize=chunksize,
+                                 usecols=usecols, dtype=dtype,
+                                 parse_dates=parse_dates)
+        except FileNotFoundError:
+            print(f"File {file_name} not found.")
+            return
+
+        with reader:
+            for chunk in reader:
+                yield cls(chunk)
+
     def write_to_file(self, file_name: str):
         """
         Write data to a CSV file
+        The format is chosen by the file extension: .parquet, .feather
+        (or .arrow) and .npy write binary columnar files that
+        read_from_file loads without parsing text, anything else is CSV
         :param data: data to write to CSV file
         :param file_name: name of the output file
         :return: void
         """
 
-        self.data.to_csv(file_name)
+        if _binary_format(file_name):
+            _write_binary(self.data, file_name)
+        else:
+            self.data.to_csv(file_name)
+
+    def track_stats(self):
+        """
+        Start the incremental mode: running statistics of every numeric
+        column are computed from the current data, and updated by append.
+        While they are tracked, scaling, standardize and impute_outliers
+        use them instead of statistics of self.data alone, so the rows
+        returned by append are transformed as part of the whole history.
+        :return: self
+        """
+
+        self.stats = {col: RunningStats().update(self.data[col])
+                      for col in self.data if _is_numeric(self.data[col])}
+        return self
+
+    def append(self, rows, keep_history=True):
+        """
+        Append new rows (e.g. the latest sensor readings) and update the
+        running statistics with them, without going over the history again.
+        Starts the incremental mode if it isn't started yet.
+        :param rows: DataFrame or TimeSeries with the columns of self.data
+        :param keep_history: keep every row in self.data. If False only the
+            last row is kept, which is all that append needs, so memory
+            stays constant however many rows are appended
+        :return: TimeSeries of the new rows, sharing the running statistics,
+            whose tail is the last row before them. Its preprocessing
+            methods continue from the history (see difference, assign_time)
+        """
 
-    def assign_time(self, start: str, increment: int):
+        if isinstance(rows, TimeSeries):
+            rows = rows.data
+        if self.stats is None:
+            self.track_stats()
+        for col, stats in self.stats.items():
+            stats.update(rows[col])
+
+        delta = TimeSeries(rows)
+        delta.stats = self.stats
+        delta.tail = self.data.iloc[-1:]
+        delta.offset = self.offset + len(self.data)
+        if keep_history:
+            self.data = pd.concat([self.data, rows])
+        elif len(rows):
+            self.offset = delta.offset + len(rows) - 1
+            self.data = rows.iloc[-1:]
+        return delta
+
+    def assign_time(self, start: str, increment):
         """
-        If a csv file does not include a date section, this method adds it. 
-        Accomplished by iterating over all rows and adding the date
+        If a csv file does not include a date section, this method adds it.
+        All timestamps are built at once with pandas.date_range. They are
+        stored in new "Date" and "Time" columns and as the datetime64 index
+        of the data, which clip uses for date range queries.
         Expected input: 01/23/2021 12:30 (mm/dd/yyyy hh:mm)
-        Use regex to extract date information to create a datetime object
-        for easy time manipulation
         :param start: The starting date of the time series
-        :type start: datetime
-        :param increment: the time interval
-        :type increment: int
+        :type start: str
+        :param increment: the time interval, either in hours (e.g. 24 or 0.25)
+            or as a pandas frequency string (e.g. "15min", "D")
+        :type increment: int, float or str
         :return: void
         """
 
-        
         try:
-            month_reg = r"^([0-9]{2})"  # matches the month
-            day_reg = r"\/([0-9]{2})\/"  # matches the day
-            year_reg = r"\/([0-9]{4})"  # matches the year
-            hour_reg = r"( [0-9]{2}):"  # matches the hour
-            minute_reg = r":([0-9]{2})"  # matches the minute
-            month = re.search(month_reg, start)  # extracted month
-            day = re.search(day_reg, start)  # extracted day
-            year = re.search(year_reg, start)  # extracted year
-            hour = re.search(hour_reg, start)  # extracted hour
-            minute = (re.search(minute_reg, start))  # extracted minute
-
-            # datetime object for easy time manipulation over an interval
-            date = datetime(year=int(year.group(1)), month=int(month.group(1)),
-                            day=int(day.group(1)), hour=int(hour.group(1)),
-                            minute=int(minute.group(1)))
+            try:
+                first = datetime.strptime(start, "%m/%d/%Y %H:%M")
+            except ValueError:
+                first = pd.Timestamp(start)  # any other format pandas understands
+
+            if isinstance(increment, str):
+                freq = increment
+            else:
+                freq = pd.Timedelta(hours=float(increment))
+            if self.offset:
+                # rows returned by append continue after the earlier rows
+                first = first + to_offset(freq) * self.offset
+            stamps = pd.date_range(first, periods=len(self.data), freq=freq,
+                                   name="Timestamp")
 
             # create the missing columns in the dataframe
-            # self.data['DATE (MM/DD/YYYY)'] = None
-            # self.data['MST'] = None
-            self.data.insert(0, "Date", None)
-            self.data.insert(1, "Time", None)
-
-            """
-            Assign each row data in the missing time and date columns.
-            Increment time time by increment. .date() and .time()
-            pull exactly what it sounds like
-            """
-            for i in range(len(self.data)):
-                self.data.at[i, self.data.columns[0]] = date.date()
-                self.data.at[i, self.data.columns[1]] = date.time()
-                date += timedelta(hours=int(increment))
-        except:
+            days = stamps.normalize()
+            self.data.insert(0, "Date", days)
+            self.data.insert(1, "Time", stamps - days)
+            self.data.index = stamps
+            self._times = None  # clip now uses the new timestamps
+        except (ValueError, TypeError):
             print("Error!")
 
         print(self.data)
@@ -106,6 +433,10 @@ class TimeSeries:
         """
         This method extracts time series data from the dataframe
         within a specified date (starting_date) and ending date (final_date)
+        Both dates are included. The rows are found by binary search in
+        a sorted index of the timestamps, built once per time series (see
+        _time_index), and copied out of self.data, so methods modifying
+        the result in place leave this time series untouched.
         :param starting_date: date str in the form of mm/dd/yyyy
         :type starting_date: str
         :param final_date: ending date in the form of mm/dd/yyyy
@@ -113,10 +444,49 @@ class TimeSeries:
         :return: TimeSeries with extracted data
         """
 
-        first_date = self.data.columns[0]  # copy the date header from csv
-        clipped = self.data.filter_date(first_date, starting_date, final_date)
-        # print(clipped.head())
-        return TimeSeries(clipped)
+        return self.clip_many([(starting_date, final_date)])[0]
+
+    def clip_many(self, windows):
+        """
+        Extract many date ranges at once, like calling clip for each of
+        them, with a single vectorized binary search.
+        :param windows: list of (starting_date, final_date) pairs
+        :return: list of TimeSeries, one per window
+        """
+
+        stamps, order = self._time_index()
+        starts = pd.to_datetime([start for start, _ in windows])
+        ends = pd.to_datetime([end for _, end in windows])
+        lows = stamps.searchsorted(starts, side="left")
+        highs = stamps.searchsorted(ends, side="right")
+        if order is None:
+            return [TimeSeries(self.data.iloc[low:high].copy())
+                    for low, high in zip(lows, highs)]
+        # unsorted timestamps: the rows are taken in their original order
+        return [TimeSeries(self.data.iloc[np.sort(order[low:high])])
+                for low, high in zip(lows, highs)]
+
+    def _time_index(self):
+        """
+        The timestamps of the rows, sorted, for the binary searches of clip.
+        They come from the datetime index set by assign_time, otherwise
+        from the first column (the date column of the csv). They are
+        parsed and sorted only once, until self.data is replaced.
+        :return: (sorted DatetimeIndex, positions of the sorted
+            timestamps in self.data or None if they are already in order)
+        """
+
+        if self._times is None:
+            if isinstance(self.data.index, pd.DatetimeIndex):
+                stamps = self.data.index
+            else:
+                stamps = pd.DatetimeIndex(pd.to_datetime(self.data.iloc[:, 0]))
+            if stamps.is_monotonic_increasing:
+                self._times = (stamps, None)
+            else:
+                order = np.argsort(stamps.to_numpy(), kind="stable")
+                self._times = (stamps[order], order)
+        return self._times
 
     def denoise(self):
         """
@@ -149,101 +519,149 @@ class TimeSeries:
         """
         This method calculates the difference between columns. 
         This method only modifies the data columns.
+        For rows returned by append, the last row before them (self.tail)
+        comes first in the result: its difference is only known now.
 
         :return: TimeSeries with difference calculated
         """
 
-        data_index = len(self.data.columns) - 1
-        temp = self.data.copy()
+        data = self.data
+        if self.tail is not None and len(self.tail):
+            data = pd.concat([self.tail, self.data])
+        data_index = len(data.columns) - 1
+        temp = data.copy()
         temp[temp.columns[data_index]] = \
-            self.data[self.data.columns[data_index]] - \
-            self.data[self.data.columns[data_index]].shift(-1)
+            data[data.columns[data_index]] - \
+            data[data.columns[data_index]].shift(-1)
         print(temp)
         return TimeSeries(temp)
 
-    def impute_outliers(self):
+    def impute_outliers(self, approximate=False, winsorize=False,
+                        sketch=None):
         """
         Find and remove outlies from dataframe
         Referenced: https://stackoverflow.com/questions/23199796/
         detect-and-exclude-outliers-in-pandas-data-frame
 
         Find the low and high quantile in the dataframe and
-        look through the whole dataframe and remove that value. 
-
+        look through the whole dataframe and remove that value.
+        In incremental mode (see track_stats) the quantiles are those of
+        every row seen so far, estimated by the running quantile sketch.
+
+        :param approximate: estimate the quantiles with a QuantileSketch
+            in one pass over the column, with bounded memory
+        :param winsorize: clip the outliers to the quantiles instead of
+            removing their rows. Float columns are clipped in place, so
+            nothing is copied, when they own their memory. Columns that
+            are read-only (e.g. memory mapped) or share their memory with
+            another frame (e.g. a slice of it) are replaced by a clipped
+            copy, leaving the other frame untouched
+        :param sketch: optional QuantileSketch of the whole series giving
+            the quantiles, e.g. the merged sketches of every chunk from
+            read_chunks, so that each chunk is cleaned the same way
         :returns: void
         """
 
-        temp = self.data.copy()
-
-
-        data_index = len(self.data.columns) - 1
-
-        q_low = self.data[self.data.columns[data_index]].quantile(.01)
-        q_high = self.data[self.data.columns[data_index]].quantile(.99)
-        self.data = self.data[(self.data[temp.columns[data_index]] < q_high) &
-                        (self.data[temp.columns[data_index]] > q_low)]
-        #print(self.data)
+        column = self.data.columns[-1]
+        stats = self._column_stats(column)
+        if sketch is None and stats is not None:
+            sketch = stats.sketch
+        if sketch is None and approximate:
+            sketch = QuantileSketch().update(self.data[column])
+
+        if sketch is not None:
+            q_low, q_high = sketch.quantile([.01, .99])
+        else:
+            q_low, q_high = self.data[column].quantile([.01, .99])
+
+        if winsorize:
+            values = self.data[column].to_numpy()
+            if values.dtype.kind == "f" and values.flags.writeable and \
+                    _owns_buffer(values):
+                np.clip(values, q_low, q_high, out=values)  # NaNs stay NaN
+            else:
+                self.data[column] = np.clip(values, q_low, q_high)
+        else:
+            self.data = self.data[(self.data[column] < q_high) &
+                                  (self.data[column] > q_low)]
 
     def longest_continuous_run(self):
         """
         This method finds the longest continuous run in a dataframe.
         A continuous run can be defined as rows that don't have
-        any missing information (NaNs).
+        any missing information (NaNs). The rows of the run are
+        copied out of self.data.
         df = dataframe
         :return: TimeSeries with longest continuous run
         """
 
-        temp = self.data.isna()  # find NaNs in df
-        runs = []   # holds index of NaNs
+        starts, ends = self._runs()
+        if len(starts) == 0:
+            return TimeSeries(self.data.iloc[0:0])  # blank df
+
+        longest = np.argmax(ends - starts)  # first run wins a tie
+        return TimeSeries(self.data.iloc[starts[longest]:ends[longest]].copy())
+
+    def continuous_runs(self, min_length=1):
+        """
+        This method finds every continuous run (rows without NaNs)
+        that has at least min_length rows. The rows of each run are
+        copied, so methods modifying a run in place leave this time
+        series untouched.
+        :param min_length: minimum number of rows in a run
+        :return: list of TimeSeries, one per run, in order
+        """
+
+        starts, ends = self._runs()
+        return [TimeSeries(self.data.iloc[start:end].copy())
+                for start, end in zip(starts, ends)
+                if end - start >= min_length]
+
+    def _runs(self):
+        """
+        Finds the runs of rows without NaNs in the data column with a
+        single pass over its NaN mask.
+        :return: arrays of the first and one-past-last positions of runs
+        """
+
         data_index = len(self.data.columns) - 1
-        for i in range(len(temp)):
-            if temp.at[i, temp.columns[data_index]] == True:
-                runs.append(i + 1)
-
-        runs.append(len(temp) + 1)  # end of file
-
-        ret = self.data.iloc[0:0]  # blank df
-        for i in range(len(runs) - 1):
-            first = runs[i]
-            last = runs[i + 1]
-            temp = self.data.iloc[first : last - 1]
-            if len(temp) > len(ret):
-                '''
-                This compares the length of the previous
-                longest run represented by a dataframe
-                '''
-                ret = temp
-        #print(ret)
-
-        return TimeSeries(ret)
+        valid = self.data[self.data.columns[data_index]].notna().to_numpy()
+        # +1 where a run starts and -1 one past where it ends
+        edges = np.diff(np.concatenate(([0], valid.astype(np.int8), [0])))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    def lazy_mode(self, enabled=True):
+        """
+        Turn lazy evaluation on or off. In lazy mode the elementwise
+        methods (scaling, standardize, logarithm, cubic_root) only record
+        what to do, and a chain of them is applied in one go when the data
+        is first needed (by ts2db, clip, plots, ...): the data is copied
+        once instead of once per method. The time series returned by these
+        methods are lazy too. Don't modify the data in place before the
+        results are used, they read it when they are materialized.
+        :param enabled: whether to defer the elementwise methods
+        :return: void
+        """
+
+        self.lazy = enabled
 
     def scaling(self):
         """
         Produces a time series whose magnitudes are scaled so that the resulting
         magnitudes range in the interval [0,1].
+        In incremental mode (see track_stats) the running min and max of
+        every row seen so far are used.
         """
-        new_df = self.data.copy()
-
-        # Loop through the columns in the DataFrame
-        for col in new_df:
-            # If the column contains floats or integers we can take the scaling and store it
-            if new_df[col].dtype == 'float64' or new_df[col].dtype == 'int64':
-                new_df[col] = (new_df[col] - new_df[col].min()) / (new_df[col].max() - new_df[col].min())
-        return TimeSeries(new_df)
+        return self._transform("scaling")
 
     def standardize(self):
         """
         Produces a time series whose mean is 0 and variance is 1.
+        In incremental mode (see track_stats) the running mean and
+        standard deviation of every row seen so far are used.
         :returns: Timeseries with standard data
         """
-        new_df = self.data.copy()
-
-        # Loop through the columns in the DataFrame
-        for col in new_df:
-            # If the column contains floats or integers we can take the scaling and store it
-            if new_df[col].dtype == 'float64' or new_df[col].dtype == 'int64':
-                new_df[col] = (new_df[col] - 0) / 1
-        return TimeSeries(new_df)
+        return self._transform("standardize")
 
     def logarithm(self):
         """
@@ -252,17 +670,7 @@ class TimeSeries:
 
         :returns: Timeseries with logarithm'd data
         """
-        # Create a copy of the current DataFrame
-        new_df = self.data.copy()
-
-        # Loop through the columns in the DataFrame
-        for col in new_df:
-            # If the column contains floats or integers we can take the logarithm and store it
-            if new_df[col].dtype == 'float64' or new_df[col].dtype == 'int64':
-                new_df[col] = np.log10(new_df[col])
-
-        # Return our new DataFrame
-        return TimeSeries(new_df)
+        return self._transform("logarithm")
 
     def cubic_root(self):
         """
@@ -270,17 +678,54 @@ class TimeSeries:
 
         :return: TimeSeries with Cubic root
         """
-        # Create a copy of the current DataFrame
-        new_df = self.data.copy()
+        return self._transform("cubic_root")
 
-        # Loop through the columns in the DataFrame
-        for col in new_df:
-            # If the column contains floats or integers we can take the cubic root and store it
-            if new_df[col].dtype == 'float64' or new_df[col].dtype == 'int64':
-                new_df[col] = new_df[col] ** (1 / 3)
+    def _column_stats(self, col):
+        """
+        :param col: name of a column
+        :return: the column's RunningStats in incremental mode, else None
+        """
+        if self.stats is None:
+            return None
+        return self.stats.get(col)
 
-        # Return our new DataFrame
-        return TimeSeries(new_df)
+    def _transform(self, operation):
+        """
+        Apply an elementwise operation to the numeric columns, or only
+        record it in lazy mode (see lazy_mode)
+        :param operation: name of the operation, see _elementwise
+        :return: TimeSeries with the transformed data
+        """
+
+        transformed = TimeSeries(lazy=self.lazy)
+        # the operations are queued on the data they start from
+        transformed._data = self._data
+        transformed._pending = self._pending + [(operation, self.stats)]
+        if not self.lazy:
+            transformed._materialize()
+        return transformed
+
+    def _materialize(self):
+        """
+        Apply the pending elementwise operations. The data is copied once
+        and each numeric column goes through all of them in place.
+        :return: void
+        """
+
+        data = self._data.copy()
+        # Loop through the columns in the DataFrame
+        for col in data:
+            # If the column contains floats or integers we can transform it
+            if _is_numeric(data[col]):
+                # a view of the copy for floats, a new array for integers
+                values = data[col].to_numpy(dtype=np.float64)
+                for operation, stats in self._pending:
+                    _elementwise(operation, values,
+                                 stats.get(col) if stats else None)
+                if data[col].dtype != np.float64:
+                    data[col] = values
+        self._data = data
+        self._pending = []
 
     def split_data(self, perc_training=.8, perc_valid=.01, perc_test=.19, ):
         """
@@ -290,56 +735,217 @@ class TimeSeries:
         """
         perc_valid += perc_training
         perc_test += perc_valid
-        df = pd.DataFrame(self.data)
-        array = df.values.tolist()
-        timeList = []
-        varList = []
-        for index in array:
-            timeList.append(index[0])
-            varList.append(index[-1])
-        self.train = varList[0:int(len(array) * perc_training) - 1]
-        self.val = varList[int(len(array) * perc_training):int(len(array) * perc_valid) - 1]
-        self.test = varList[int(len(array) * perc_valid):int(len(array) * perc_test) - 1]
-
-    def design_matrix(self, input_index=0, output_index=25):
-        x_train, y_train = [],[]
-        x_start = 0
-        x_end = input_index + x_start
-        y_start = x_end
-        y_end = output_index + y_start
-        while y_end <= len(self.train):
-            x_train.append(self.train[x_start:x_end])
-            y_train.append(self.train[y_start:y_end])
-            x_start += 1
-            x_end += 1
-            y_start += 1
-            y_end += 1
-
-        x_test, y_test = [],[]
-        x_start = 0
-        x_end = input_index + x_start
-        y_start = x_end
-        y_end = output_index + y_start
-        while y_end <= len(self.test):
-            x_test.append(self.test[x_start:x_end])
-            y_test.append(self.test[y_start:y_end])
-            x_start += 1
-            x_end += 1
-            y_start += 1
-            y_end += 1
+        # the splits are slices (views) of the data column, nothing is copied
+        values = self.data[self.data.columns[-1]].to_numpy()
+        n = len(values)
+        # consecutive splits, every row up to n * perc_test is in one of them
+        self.train = values[0:int(n * perc_training)]
+        self.val = values[int(n * perc_training):int(n * perc_valid)]
+        self.test = values[int(n * perc_valid):int(n * perc_test)]
+
+    def design_matrix(self, input_index=0, output_index=25, dtype=None):
+        """
+        Builds the training and testing matrices from self.train and
+        self.test. Each row holds input_index consecutive values (x) and
+        the output_index values that follow them (y).
+
+        The rows are read-only sliding-window views of the split data, so
+        no values are copied (except once per split when a dtype is given).
+
+        :param input_index: number of input values in a row
+        :param output_index: number of output values in a row
+        :param dtype: optional dtype of the matrices, e.g. np.float32
+        :return: (x_train, y_train), (x_test, y_test) as NumPy arrays
+        """
+
+        x_train, y_train = window_matrices(self.train, input_index,
+                                           output_index, dtype)
+        x_test, y_test = window_matrices(self.test, input_index,
+                                         output_index, dtype)
         return (x_train, y_train), (x_test, y_test)
 
     def ts2db(self, input_file_name, perc_training, perc_valid, perc_test, input_index,
-              output_index, output_file_name):
+              output_index, output_file_name, dtype=None):
         """read the file
             split data
-            produce a new database"""
+            produce a new database
+            dtype optionally sets the dtype of the matrices (e.g. np.float32)
+            self is left unchanged, the file and the splits go to a shallow copy"""
+        series = copy(self)
         if input_file_name:
-            self.read_from_file(input_file_name)
+            series.read_from_file(input_file_name)
 
-        self.split_data(perc_training, perc_valid, perc_test)
-        trainingMatrix, testMatrix = self.design_matrix(input_index=input_index, output_index=output_index)
+        series.split_data(perc_training, perc_valid, perc_test)
+        trainingMatrix, testMatrix = series.design_matrix(input_index=input_index, output_index=output_index,
+                                                         dtype=dtype)
         x_train, y_train = trainingMatrix[0], trainingMatrix[1]
         x_test, y_test = testMatrix[0], testMatrix[1]
 
         return x_train, y_train, x_test, y_test
+
+
+class TimeSeriesBatch:
+    """
+    Many time series stored together in one 2-D float array, one row per
+    series. Series of different lengths are padded with NaN at the end and
+    their real lengths are kept in self.lengths. Like TimeSeries, only the
+    data column (the last column of each file) is kept.
+
+    The preprocessing methods work on every series at once with NumPy and
+    can be used as tree operators: start a branch with
+    TimeSeriesBatch.read_from_files under the root node.
+    """
+
+    def __init__(self, values=None, lengths=None, names=None):
+        """
+        :param values: 2-D array, one (NaN padded) series per row
+        :param lengths: number of values in each series, defaults to the
+            full width of values
+        :param names: name of each series, defaults to their row numbers
+        """
+        self.values = np.empty((0, 0)) if values is None else \
+            np.asarray(values, dtype=float)
+        n_series, width = self.values.shape
+        self.lengths = np.full(n_series, width) if lengths is None else \
+            np.asarray(lengths, dtype=int)
+        self.names = list(range(n_series)) if names is None else list(names)
+
+    @staticmethod
+    def from_series(series, names=None):
+        """
+        Stack the data columns of TimeSeries objects into a batch
+        :param series: list of TimeSeries
+        :param names: optional name of each series
+        :return: TimeSeriesBatch
+        """
+        columns = [ts.data[ts.data.columns[-1]].to_numpy(dtype=float)
+                   for ts in series]
+        lengths = np.array([len(column) for column in columns], dtype=int)
+        values = np.full((len(columns), lengths.max(initial=0)), np.nan)
+        for row, column in enumerate(columns):
+            values[row, :len(column)] = column
+        return TimeSeriesBatch(values, lengths, names)
+
+    @staticmethod
+    def read_from_files(file_names, dtype=None):
+        """
+        Read many CSV files into one batch
+        :param file_names: list of csv file names
+        :param dtype: see TimeSeries.read_from_file
+        :return: TimeSeriesBatch with one series per file
+        """
+        series = [TimeSeries().read_from_file(file_name, dtype=dtype)
+                  for file_name in file_names]
+        return TimeSeriesBatch.from_series(
+            series, [os.path.basename(file_name) for file_name in file_names])
+
+    def select(self, index):
+        """
+        Extract a single series, e.g. to model one station
+        :param index: row number or name of the series
+        :return: TimeSeries holding the series
+        """
+        row = index if isinstance(index, (int, np.integer)) \
+            else self.names.index(index)
+        values = self.values[row, :self.lengths[row]]
+        return TimeSeries(pd.DataFrame({self.names[row]: values}))
+
+    def __len__(self):
+        return len(self.values)
+
+    def _padding(self):
+        """
+        :return: boolean mask of the padding after each series
+        """
+        return np.arange(self.values.shape[1]) >= self.lengths[:, None]
+
+    def _new(self, values):
+        return TimeSeriesBatch(values, self.lengths.copy(), self.names)
+
+    def impute_missing(self):
+        """
+        Fill NaNs with the next valid value of the same series (like
+        TimeSeries.impute_missing's bfill), in one pass over all series
+
+        :returns: void
+        """
+
+        n_series, width = self.values.shape
+        missing = np.isnan(self.values)
+        # position of the next valid value, width (a NaN column) if none
+        positions = np.where(missing, width, np.arange(width))
+        positions = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1]
+        padded = np.concatenate([self.values, np.full((n_series, 1), np.nan)],
+                                axis=1)
+        self.values = np.take_along_axis(padded, positions, axis=1)
+
+    def impute_outliers(self):
+        """
+        Remove the values of each series outside of its .01 and .99
+        quantiles (and NaNs), like TimeSeries.impute_outliers. The
+        remaining values are moved to the front of each row, so the series
+        may end up with different lengths.
+
+        :returns: void
+        """
+
+        quantiles = np.nanquantile(self.values, [.01, .99], axis=1)
+        keep = (self.values > quantiles[0][:, None]) & \
+               (self.values < quantiles[1][:, None])
+        # a stable sort on ~keep moves the kept values to the front in order
+        order = np.argsort(~keep, axis=1, kind="stable")
+        values = np.take_along_axis(self.values, order, axis=1)
+        self.lengths = keep.sum(axis=1)
+        self.values = values[:, :self.lengths.max(initial=0)]
+        self.values[self._padding()] = np.nan
+
+    def difference(self):
+        """
+        Difference between each value and the next one of the same series
+
+        :return: TimeSeriesBatch with difference calculated
+        """
+
+        values = np.full(self.values.shape, np.nan)
+        values[:, :-1] = self.values[:, :-1] - self.values[:, 1:]
+        return self._new(values)
+
+    def scaling(self):
+        """
+        Scale each series to the interval [0,1]
+
+        :return: TimeSeriesBatch with scaled data
+        """
+
+        low = np.nanmin(self.values, axis=1, keepdims=True)
+        high = np.nanmax(self.values, axis=1, keepdims=True)
+        return self._new((self.values - low) / (high - low))
+
+    def standardize(self):
+        """
+        Standardize each series to mean 0 and variance 1
+
+        :return: TimeSeriesBatch with standard data
+        """
+
+        mean = np.nanmean(self.values, axis=1, keepdims=True)
+        std = np.nanstd(self.values, axis=1, keepdims=True, ddof=1)
+        return self._new((self.values - mean) / std)
+
+    def logarithm(self):
+        """
+        Logarithm (base 10) of every value
+
+        :return: TimeSeriesBatch with logarithm'd data
+        """
+
+        return self._new(np.log10(self.values))
+
+    def cubic_root(self):
+        """
+        Cubic root of every value
+
+        :return: TimeSeriesBatch with cubic root
+        """
+
+        return self._new(self.values ** (1 / 3))
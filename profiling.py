@@ -0,0 +1,197 @@
+'''
+This module implements a per-node profiler for transformation trees. When a Profiler is assigned to a tree's
+profiler attribute, every node execution records its wall time, CPU time, peak memory, input/output sizes and
+whether its result came from the tree's cache.
+'''
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Fields of a node profile that are summed when a node is executed more than once
+_SUMMED_FIELDS = ("wall_time", "cpu_time", "input_bytes", "output_bytes", "cache_hits")
+
+
+def size_of(value):
+    '''
+    Estimates the size in bytes of a value stored in a branch dictionary.
+
+    ARGS:
+        value: DataFrame, NumPy array, TimeSeries, list/tuple of those, or any other object
+
+    RETURNS:
+        the estimated size in bytes
+    '''
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=False))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(size_of(item) for item in value)
+    # A lazy TimeSeries is measured by the data it starts from, reading its data would materialize it
+    data = getattr(value, "_data", None)
+    if data is None:
+        data = getattr(value, "data", None)
+    if isinstance(data, pd.DataFrame):
+        return size_of(data)
+    return sys.getsizeof(value)
+
+
+class Profiler:
+    '''
+    Collects one record per node execution. Records are kept in execution order in self.records as
+    (path string, node key, record dict) triples. The path string comes from TransformationTree.get_path_str and is
+    only used for display: replicated subtrees have the same path strings, so nodes are told apart by their key, the
+    child indices leading from the root to the node.
+    '''
+    def __init__(self, track_memory=False):
+        '''
+        ARGS:
+            track_memory: record the peak memory allocated by each operator using tracemalloc. This slows execution
+                          down noticeably, and with the thread executor the peaks of concurrent nodes overlap.
+                          Default False.
+        '''
+        self.track_memory = track_memory
+        self.records = []
+
+    def start(self):
+        '''
+        Called by the tree right before a node executes.
+
+        RETURNS:
+            a token passed to self.stop
+        '''
+        memory = None
+        if self.track_memory:
+            if hasattr(tracemalloc, "reset_peak"):
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+            else:
+                # Python 3.8 has no reset_peak, restarting the tracing resets the peak (and the traced memory)
+                tracemalloc.stop()
+                tracemalloc.start()
+            memory = tracemalloc.get_traced_memory()[0]
+        return time.perf_counter(), time.thread_time(), memory
+
+    def stop(self, token, inputs, result, cache_hit):
+        '''
+        Called by the tree right after a node executed.
+
+        ARGS:
+            token: value returned by self.start
+            inputs: list of the values the operator was called with
+            result: value returned by the operator
+            cache_hit: whether the result was loaded from the tree's cache
+
+        RETURNS:
+            the record of the node execution as a dict
+        '''
+        wall_start, cpu_start, memory_start = token
+        record = {
+            "wall_time": time.perf_counter() - wall_start,
+            "cpu_time": time.thread_time() - cpu_start,
+            "peak_memory": None,
+            "input_bytes": sum(size_of(value) for value in inputs),
+            "output_bytes": size_of(result) if result is not None else 0,
+            "cache_hits": int(cache_hit)
+        }
+        if memory_start is not None:
+            record["peak_memory"] = max(tracemalloc.get_traced_memory()[1] - memory_start, 0)
+        return record
+
+    def add(self, path, key, record):
+        '''
+        Adds the record of a node execution. Called by the tree once execution is finished.
+
+        ARGS:
+            path: path string of the node, from TransformationTree.get_path_str
+            key: tuple of the child indices leading from the root to the node
+            record: dict returned by self.stop
+        '''
+        self.records.append((path, key, record))
+
+    def clear(self):
+        '''
+        Removes every record.
+        '''
+        self.records = []
+
+    def report(self):
+        '''
+        Aggregates the records by node.
+
+        RETURNS:
+            a dict mapping node keys to dicts holding the node's path string ("path"), the number of executions
+            ("calls"), the summed wall time, CPU time, input/output bytes and cache hits, and the largest peak memory
+            of the node
+        '''
+        report = {}
+        for path, key, record in self.records:
+            entry = report.setdefault(key, {"path": path, "calls": 0, "peak_memory": None,
+                                            **{field: 0 for field in _SUMMED_FIELDS}})
+            entry["calls"] += 1
+            for field in _SUMMED_FIELDS:
+                entry[field] += record[field]
+            if record["peak_memory"] is not None:
+                entry["peak_memory"] = max(entry["peak_memory"] or 0, record["peak_memory"])
+        return report
+
+    def top(self, n=10, by="wall_time"):
+        '''
+        Finds the most expensive nodes.
+
+        ARGS:
+            n: number of nodes to return. Default 10.
+            by: field of the report to sort by, e.g. "wall_time", "cpu_time" or "peak_memory". Default "wall_time".
+
+        RETURNS:
+            a list of up to n (node key, report entry) pairs, most expensive first
+        '''
+        entries = self.report().items()
+        return sorted(entries, key=lambda entry: entry[1][by] or 0, reverse=True)[:n]
+
+    def summary(self, n=10, by="wall_time"):
+        '''
+        Formats self.top(n, by) as a table.
+
+        RETURNS:
+            a string with one line per node, showing its key after its path string
+        '''
+        lines = [f"{'wall (s)':>10} {'cpu (s)':>10} {'calls':>6} {'hits':>5}  node"]
+        for key, entry in self.top(n, by):
+            lines.append(f"{entry['wall_time']:>10.4f} {entry['cpu_time']:>10.4f} {entry['calls']:>6} "
+                         f"{entry['cache_hits']:>5}  {entry['path']} {key}")
+        return "\n".join(lines)
+
+    def folded(self):
+        '''
+        Exports the wall times in the "folded stacks" format read by flame graph tools
+        (flamegraph.pl, speedscope, inferno). Each node is a frame below the nodes on its path,
+        so a frame's width is the time of its whole subtree. Frames below the root end with "#" and the node's index
+        among its siblings, so nodes with the same name (e.g. in replicated subtrees) stay separate.
+
+        RETURNS:
+            a string with one "frame;frame;frame microseconds" line per node
+        '''
+        lines = []
+        for key, entry in self.report().items():
+            names = [name.replace(";", ":") for name in entry["path"].split(" -> ")]
+            frames = names[:1] + [f"{name}#{index}" for name, index in zip(names[1:], key)]
+            lines.append(f"{';'.join(frames)} {int(entry['wall_time'] * 1e6)}")
+        return "\n".join(lines)
+
+    def write_folded(self, filename):
+        '''
+        Writes self.folded() to a file.
+
+        ARGS:
+            filename: name of the output file
+        '''
+        with open(filename, 'w') as file:
+            file.write(self.folded() + "\n")
@@ -0,0 +1,118 @@
+'''
+This module implements a streaming quantile sketch in the style of KLL (Karnin, Lang, Liberty 2016). It summarizes
+a stream of values in bounded memory so that approximate quantiles can be computed without sorting or even keeping
+the whole stream, which is what the incremental and approximate modes of TimeSeries.impute_outliers rely on.
+'''
+
+import numpy as np
+
+
+class QuantileSketch:
+    '''
+    Approximate quantiles of a stream of values. The sketch keeps a stack of compactors: level i holds values that
+    each stand for 2**i values of the stream. When a level is full it is sorted and every other value (starting at a
+    random offset) is promoted to the next level. Memory stays around 3 * k values, and the rank error of a quantile
+    is about 1/k of the stream length. Streams shorter than k are kept whole, so their quantiles are exact.
+    NaNs are ignored. Sketches of different chunks or partitions can be combined with merge, e.g.
+
+        sketch = QuantileSketch()
+        for ts in TimeSeries.read_chunks(file_name, 100000):
+            sketch.merge(QuantileSketch().update(ts.data[ts.data.columns[-1]]))
+    '''
+    def __init__(self, k=1000, seed=None):
+        '''
+        ARGS:
+            k: size of the largest compactor, trading memory for accuracy. Default 1000.
+            seed: seed of the random offsets used by compaction. Default None.
+        '''
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        '''
+        Adds values to the sketch.
+
+        ARGS:
+            values: scalar, list or array of values
+
+        RETURNS:
+            the sketch itself
+        '''
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        # Values are added k at a time so only small compactors are ever sorted, even for a large array
+        for start in range(0, len(values), self.k):
+            self.levels[0] = np.concatenate([self.levels[0], values[start:start + self.k]])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        '''
+        Adds the values summarized by another sketch, e.g. one built on another chunk or partition of the data.
+        The result is about as accurate as a single sketch of both streams.
+
+        ARGS:
+            other: QuantileSketch
+
+        RETURNS:
+            the sketch itself
+        '''
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for height, level in enumerate(other.levels):
+            self.levels[height] = np.concatenate([self.levels[height], level])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        '''
+        Approximates one or more quantiles of the values added so far.
+
+        ARGS:
+            q: quantile or array of quantiles between 0 and 1
+
+        RETURNS:
+            the approximate quantile(s) as a float or array, NaN if the sketch is empty
+        '''
+        items, weights = self._weighted_items()
+        if len(items) == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float("nan")
+        order = np.argsort(items, kind="stable")
+        items, weights = items[order], weights[order]
+        # Rank of each item scaled to [0, 1], which interpolates like np.quantile when every weight is 1
+        ranks = np.cumsum(weights) - weights
+        ranks = ranks / ranks[-1] if ranks[-1] > 0 else ranks
+        result = np.interp(np.asarray(q, dtype=float), ranks, items)
+        return result if np.ndim(q) else float(result)
+
+    def __len__(self):
+        return self.count
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** height) for height, level in enumerate(self.levels)])
+        return items, weights
+
+    def _capacity(self, height):
+        # Lower levels get geometrically smaller compactors, as in KLL
+        depth = len(self.levels) - height - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        height = 0
+        while height < len(self.levels):
+            level = self.levels[height]
+            if len(level) > self._capacity(height):
+                if height + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                # An odd value out stays at this level, the rest is halved into the next one
+                leftover, level = level[:len(level) % 2], level[len(level) % 2:]
+                promoted = level[self._rng.integers(2)::2]
+                self.levels[height] = leftover
+                self.levels[height + 1] = np.concatenate([self.levels[height + 1], promoted])
+            height += 1
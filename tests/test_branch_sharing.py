@@ -0,0 +1,96 @@
+'''
+Tests that operators modifying their input in place in one branch of a TransformationTree leave the values shared with
+the other branches untouched.
+'''
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import operatorkeys
+import preprocessing
+import tree
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+START = "01/01/2021 00:00"
+CLIP = ["01/01/2021", "03/01/2021"]
+
+
+def build_tree():
+    t = tree.TransformationTree(operatorkeys.operator_input_keys, operatorkeys.operator_output_keys,
+                                operatorkeys.operator_inplace_keys)
+    read = t.add_operator(preprocessing.TimeSeries.read_from_file, [DATA_FILE], t.root)
+    return t, t.add_operator(preprocessing.TimeSeries.assign_time, [START, 1], read)
+
+
+def test_winsorize_leaves_sibling_and_source_unchanged():
+    t, timed = build_tree()
+    clipped = t.add_operator(preprocessing.TimeSeries.clip, CLIP, timed)
+    t.add_operator(preprocessing.TimeSeries.impute_outliers, [False, True], clipped)
+    sibling = t.add_operator(preprocessing.TimeSeries.clip, CLIP, timed, save_result=True)
+    source = t.add_operator(preprocessing.TimeSeries.longest_continuous_run, [], timed, save_result=True)
+    t.execute_tree()
+
+    results = {node: result for result, node in t.results}
+    values = pd.read_csv(DATA_FILE).iloc[:, -1].to_numpy()
+    sibling_values = results[sibling].data.iloc[:, -1].to_numpy()
+    # The clip covers the first 59 days of hourly values, both dates included
+    np.testing.assert_array_equal(sibling_values, values[:59 * 24 + 1])
+    np.testing.assert_array_equal(results[source].data.iloc[:, -1].to_numpy(), values)
+
+
+def test_winsorize_in_place_when_the_column_owns_its_memory():
+    series = preprocessing.TimeSeries(pd.read_csv(DATA_FILE))
+    values = series.data.iloc[:, -1].to_numpy()
+    series.impute_outliers(winsorize=True)
+
+    assert np.shares_memory(series.data.iloc[:, -1].to_numpy(), values)
+    assert values.max() <= np.quantile(pd.read_csv(DATA_FILE).iloc[:, -1], .99)
+
+
+def test_clip_copies_the_rows():
+    series = preprocessing.TimeSeries(pd.read_csv(DATA_FILE))
+    series.assign_time(START, 1)
+    values = series.data.iloc[:, -1].to_numpy()
+
+    for clipped in series.clip_many([CLIP, ["02/01/2021", "02/02/2021"]]):
+        assert not np.shares_memory(clipped.data.iloc[:, -1].to_numpy(), values)
+
+
+def test_continuous_runs_copy_the_rows():
+    data = pd.read_csv(DATA_FILE)
+    data.iloc[100, -1] = np.nan
+    series = preprocessing.TimeSeries(data)
+    values = series.data.iloc[:, -1].to_numpy()
+
+    runs = series.continuous_runs() + [series.longest_continuous_run()]
+    assert [len(run.data) for run in runs] == [100, len(data) - 101, len(data) - 101]
+    for run in runs:
+        assert not np.shares_memory(run.data.iloc[:, -1].to_numpy(), values)
+
+
+def test_ts2db_branches_share_the_series(monkeypatch):
+    copies = []
+    deepcopy = tree.deepcopy
+    monkeypatch.setattr(tree, "deepcopy", lambda value: copies.append(value) or deepcopy(value))
+    t, timed = build_tree()
+    for input_index in range(2, 6):
+        t.add_operator(preprocessing.TimeSeries.ts2db, [None, .8, .1, .1, input_index, 1, None], timed, save_result=True)
+    t.execute_tree()
+
+    assert copies == []
+    for (x_train, y_train, x_test, y_test), node in t.results:
+        assert x_train.shape[1] == node.args[4] and len(x_train) == len(y_train)
+
+
+def test_ts2db_leaves_the_series_unchanged():
+    series = preprocessing.TimeSeries(pd.read_csv(DATA_FILE))
+    data = series.data
+    x_train, y_train, x_test, y_test = series.ts2db(None, .8, .1, .1, 3, 1, None)
+
+    assert series.data is data and not hasattr(series, "train")
+    np.testing.assert_array_equal(y_train[:, 0], data.iloc[3:1200, -1])
@@ -0,0 +1,125 @@
+'''
+Tests for the result cache of TransformationTree: which nodes are recomputed when an arg, an input file or the cache
+itself changes, across the memory and disk tiers.
+'''
+
+import os
+import shutil
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import cache
+import operatorkeys
+import preprocessing
+import tree
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+TimeSeries = preprocessing.TimeSeries
+
+
+def build_tree(data_file, result_cache):
+    '''
+    read -> impute_missing -> standardize -> [ts2db(input_index 3), ts2db(input_index 4)], saving both ts2db results
+    '''
+    t = tree.TransformationTree(operatorkeys.operator_input_keys, operatorkeys.operator_output_keys,
+                                operatorkeys.operator_inplace_keys)
+    t.cache = result_cache
+    read = t.add_operator(TimeSeries.read_from_file, [data_file], t.root, tag="read")
+    imputed = t.add_operator(TimeSeries.impute_missing, [], read)
+    standard = t.add_operator(TimeSeries.standardize, [], imputed, tag="standard")
+    for input_index in (3, 4):
+        t.add_operator(TimeSeries.ts2db, [None, .8, .1, .1, input_index, 1, None], standard, tag=f"db{input_index}",
+                       save_result=True)
+    return t
+
+
+def execute(t):
+    '''
+    Returns:
+        (hits, misses, results) of an execution of t
+    '''
+    hits, misses = t.cache.hits, t.cache.misses
+    t.execute_tree()
+    return t.cache.hits - hits, t.cache.misses - misses, t.results
+
+
+def assert_same_results(results, expected):
+    assert [node for _, node in results] == [node for _, node in expected]
+    for (result, _), (expected_result, _) in zip(results, expected):
+        for matrix, expected_matrix in zip(result, expected_result):
+            assert (matrix == expected_matrix).all()
+
+
+def test_second_execution_is_all_hits():
+    t = build_tree(DATA_FILE, cache.ResultCache())
+    hits, misses, expected = execute(t)
+    assert (hits, misses) == (0, 6)
+
+    hits, misses, results = execute(t)
+    assert (hits, misses) == (6, 0)
+    assert_same_results(results, expected)
+
+
+def test_changed_arg_only_recomputes_the_nodes_below():
+    t = build_tree(DATA_FILE, cache.ResultCache())
+    execute(t)
+    db3 = t.get_nodes_by_tag("db3")[0]
+    db3.args[4] = 5
+
+    hits, misses, results = execute(t)
+    # root, read, impute_missing, standardize and the other ts2db are unchanged
+    assert (hits, misses) == (5, 1)
+    assert results[0][0][0].shape[1] == 5
+
+    standard = t.get_nodes_by_tag("standard")[0]
+    t.replace_operator(TimeSeries.cubic_root, [], standard, tag="standard")
+    hits, misses, results = execute(t)
+    assert (hits, misses) == (3, 3)
+
+
+def test_changed_input_file_recomputes_every_node_reading_it(tmp_path):
+    data_file = str(tmp_path / "data.csv")
+    shutil.copy(DATA_FILE, data_file)
+    t = build_tree(data_file, cache.ResultCache())
+    execute(t)
+
+    data = pd.read_csv(data_file)
+    data.iloc[:, -1] += 1
+    data.to_csv(data_file, index=False)
+    # The root doesn't read the file
+    hits, misses, results = execute(t)
+    assert (hits, misses) == (1, 5)
+    assert results[0][0][0][0, 0] == TimeSeries(data).standardize().data.iloc[0, -1]
+
+
+def test_disk_tier_is_shared_by_new_caches(tmp_path):
+    t = build_tree(DATA_FILE, cache.ResultCache(directory=str(tmp_path)))
+    _, _, expected = execute(t)
+
+    t.cache = cache.ResultCache(directory=str(tmp_path))
+    hits, misses, results = execute(t)
+    assert (hits, misses) == (6, 0)
+    assert_same_results(results, expected)
+
+
+def test_entries_evicted_from_memory_are_read_from_disk(tmp_path):
+    t = build_tree(DATA_FILE, cache.ResultCache(max_entries=2, directory=str(tmp_path)))
+    _, _, expected = execute(t)
+    assert len(t.cache) == 2
+
+    hits, misses, results = execute(t)
+    assert (hits, misses) == (6, 0)
+    assert_same_results(results, expected)
+
+
+def test_invalidate_cache_removes_a_subtree_from_both_tiers(tmp_path):
+    t = build_tree(DATA_FILE, cache.ResultCache(directory=str(tmp_path)))
+    execute(t)
+
+    t.invalidate_cache(t.get_nodes_by_tag("standard")[0])
+    assert len(os.listdir(tmp_path)) == 3
+    hits, misses, _ = execute(t)
+    assert (hits, misses) == (3, 3)
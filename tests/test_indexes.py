@@ -0,0 +1,123 @@
+'''
+Tests that the tag and operator indexes of TransformationTree, and the available keys of its nodes, stay in line with the
+tree through every method editing it, pickling and tree.save and tree.load.
+'''
+
+import os
+import pickle
+import sys
+from collections import deque
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import operatorkeys
+import preprocessing
+import tree
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+TimeSeries = preprocessing.TimeSeries
+
+
+def describe(timeseries):
+    return str(timeseries)
+
+
+def build_tree():
+    '''
+    read -> [standardize -> ts2db, cubic_root -> logarithm]
+    '''
+    input_keys = dict(operatorkeys.operator_input_keys)
+    output_keys = dict(operatorkeys.operator_output_keys)
+    input_keys[describe], output_keys[describe] = ["timeseries_without_data"], []
+    t = tree.TransformationTree(input_keys, output_keys, operatorkeys.operator_inplace_keys)
+    read = t.add_operator(TimeSeries.read_from_file, [DATA_FILE], t.root, tag="read")
+    standard = t.add_operator(TimeSeries.standardize, [], read, tag="standard")
+    t.add_operator(TimeSeries.ts2db, [None, .8, .1, .1, 3, 1, None], standard, tag="db")
+    cubed = t.add_operator(TimeSeries.cubic_root, [], read, tag="cubed")
+    t.add_operator(TimeSeries.logarithm, [], cubed, tag="log")
+    return t
+
+
+def scan(t, mode):
+    '''
+    Returns:
+        dict: tag or operator -> nodes having it, found by walking the whole tree in preorder
+    '''
+    found = {}
+    stack = [t.root]
+    while stack:
+        node = stack.pop()
+        found.setdefault(node.tag if mode == "tag" else node.operator, []).append(node)
+        stack.extend(reversed(node.children))
+    return found
+
+
+def assert_indexes_match_tree(t):
+    for mode, get_nodes in (("tag", t.get_nodes_by_tag), ("operator", t.get_nodes_by_operator)):
+        found = scan(t, mode)
+        # The indexes keep insertion order, which isn't the preorder of the tree, so they're compared as sets
+        assert {value: set(nodes) for value, nodes in found.items()} == \
+            {value: set(get_nodes(value)) for value in found}
+        assert sum(len(nodes) for nodes in found.values()) == len(t._key_sets)
+    q = deque([t.root])
+    while q:
+        node = q.popleft()
+        parent_keys = t._key_sets[node.parent] if node.parent is not None else frozenset()
+        assert t._key_sets[node] == parent_keys.union(t.output_keys[node.operator])
+        q.extend(node.children)
+
+
+def test_indexes_follow_add_and_replace():
+    t = build_tree()
+    assert_indexes_match_tree(t)
+    assert [node.tag for node in t.get_nodes_by_operator(TimeSeries.ts2db)] == ["db"]
+
+    standard = t.get_nodes_by_tag("standard")[0]
+    scaled = t.replace_operator(TimeSeries.cubic_root, [], standard, tag="scaled")
+    assert_indexes_match_tree(t)
+    assert t.get_nodes_by_tag("standard") == [] and t.get_nodes_by_tag("db")[0].parent is scaled
+    assert len(t.get_nodes_by_operator(TimeSeries.cubic_root)) == 2
+
+    # The children of read need the timeseries_data describe doesn't create, so the replacement is dropped
+    read = t.get_nodes_by_tag("read")[0]
+    t.replace_operator(describe, [], read, tag="describe")
+    assert_indexes_match_tree(t)
+    assert t.get_nodes_by_tag("describe") == [] and t.root.children == [read]
+
+
+def test_indexes_follow_replication():
+    t = build_tree()
+    replica = t.replicate_subtree(t.get_nodes_by_tag("standard")[0])
+    assert_indexes_match_tree(t)
+    assert t.get_nodes_by_tag("db_copy") == [replica.children[0]]
+    assert len(t.get_nodes_by_operator(TimeSeries.ts2db)) == 2
+
+    read = t.get_nodes_by_tag("read")[0]
+    t.replicate_path(read, t.get_nodes_by_tag("log")[0])
+    assert_indexes_match_tree(t)
+    assert len(t.get_nodes_by_tag("read")) == 2 and len(t.get_nodes_by_tag("log")) == 2
+
+
+@pytest.mark.parametrize("round_trip", ["pickle", "save"])
+def test_indexes_are_rebuilt_after_loading(tmp_path, round_trip):
+    t = build_tree()
+    if round_trip == "pickle":
+        loaded = pickle.loads(pickle.dumps(t))
+    else:
+        filename = str(tmp_path / "tree.sav")
+        assert tree.save(t, filename)
+        loaded = tree.load(filename)
+
+    assert_indexes_match_tree(loaded)
+    assert loaded.get_nodes_by_tag("db")[0].parent is loaded.get_nodes_by_tag("standard")[0]
+    loaded.add_operator(TimeSeries.difference, [], loaded.get_nodes_by_tag("log")[0], tag="diff")
+    assert_indexes_match_tree(loaded)
+
+
+def test_compatibility_uses_the_available_keys():
+    t = build_tree()
+    with pytest.raises(tree.CompatibilityError):
+        t.add_operator(TimeSeries.ts2db, [None, .8, .1, .1, 3, 1, None], t.root)
+    assert t.get_nodes_by_operator(TimeSeries.ts2db) == t.get_nodes_by_tag("db")
@@ -0,0 +1,88 @@
+'''
+Tests for Node without a per-instance __dict__: pickling and copying keep every attribute, nodes pickled with a dict
+before __slots__ still load, and leaves and branches share their empty children and key sets.
+'''
+
+import os
+import pickle
+import sys
+from copy import deepcopy
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import operatorkeys
+import preprocessing
+import tree
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+TimeSeries = preprocessing.TimeSeries
+
+
+def build_branch():
+    '''
+    read -> standardize (saved) -> [logarithm, cubic_root]
+    '''
+    read = tree.Node(TimeSeries.read_from_file, [DATA_FILE], tag="read")
+    standard = tree.Node(TimeSeries.standardize, [], parent=read, tag="standard", save_result=True)
+    read.add_child(standard)
+    for operator in (TimeSeries.logarithm, TimeSeries.cubic_root):
+        standard.add_child(tree.Node(operator, [], parent=standard))
+    return read
+
+
+class OldNode:
+    '''
+    Pickles like a Node did before __slots__, as a Node holding the attribute dict
+    '''
+    def __init__(self, state):
+        self.state = state
+
+    def __reduce_ex__(self, protocol):
+        return object.__new__, (tree.Node,), self.state
+
+
+def assert_same_branch(copied, original):
+    assert not hasattr(copied, "__dict__")
+    assert (copied.operator, copied.args, copied.tag, copied.save_result) == \
+        (original.operator, original.args, original.tag, original.save_result)
+    assert len(copied.children) == len(original.children)
+    for copied_child, child in zip(copied.children, original.children):
+        assert copied_child.parent is copied
+        assert_same_branch(copied_child, child)
+
+
+@pytest.mark.parametrize("copy_branch", [lambda node: pickle.loads(pickle.dumps(node)), deepcopy])
+def test_copied_nodes_keep_their_attributes(copy_branch):
+    read = build_branch()
+    copied = copy_branch(read)
+
+    assert_same_branch(copied, read)
+    leaf = copied.children[0].children[0]
+    assert leaf.children == () and leaf.parent.parent is copied
+
+
+def test_nodes_pickled_with_a_dict_load():
+    state = {"operator": TimeSeries.standardize, "tag": "standard", "args": [], "parent": None,
+             "children": [], "save_result": True}
+    node = pickle.loads(pickle.dumps(OldNode(state)))
+    assert isinstance(node, tree.Node)
+    assert (node.operator, node.tag, node.args, node.save_result) == (TimeSeries.standardize, "standard", [], True)
+
+    # Attributes added later than the pickle get their defaults
+    node = pickle.loads(pickle.dumps(OldNode({"operator": TimeSeries.standardize, "tag": "", "args": []})))
+    assert (node.parent, node.children, node.save_result) == (None, (), False)
+    node.add_child(tree.Node(TimeSeries.logarithm, [], parent=node))
+    assert len(node.children) == 1
+
+
+def test_leaves_and_branches_share_children_and_key_sets():
+    t = tree.TransformationTree(operatorkeys.operator_input_keys, operatorkeys.operator_output_keys)
+    read = t.add_operator(TimeSeries.read_from_file, [DATA_FILE], t.root)
+    standards = [t.add_operator(TimeSeries.standardize, [], read) for _ in range(3)]
+    leaves = [t.add_operator(TimeSeries.logarithm, [], standard) for standard in standards]
+
+    assert all(leaf.children is leaves[0].children for leaf in leaves)
+    assert len({id(t._key_sets[leaf]) for leaf in leaves}) == 1
+    assert all(isinstance(standard.children, list) for standard in standards)
@@ -0,0 +1,120 @@
+'''
+Tests for the parallel executors of TransformationTree: the results of the thread, process and async executors match a
+sequential execution, and sibling branches run at the same time.
+'''
+
+import os
+import sys
+import threading
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import operatorkeys
+import preprocessing
+import tree
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+TimeSeries = preprocessing.TimeSeries
+
+
+def build_tree(input_keys=operatorkeys.operator_input_keys, output_keys=operatorkeys.operator_output_keys):
+    '''
+    read -> [standardize -> [ts2db x 3], cubic_root -> [logarithm, ts2db], difference], saving every leaf
+    '''
+    t = tree.TransformationTree(input_keys, output_keys, operatorkeys.operator_inplace_keys,
+                                operatorkeys.operator_io_bound)
+    read = t.add_operator(TimeSeries.read_from_file, [DATA_FILE], t.root)
+    standard = t.add_operator(TimeSeries.standardize, [], read)
+    for input_index in (2, 3, 4):
+        t.add_operator(TimeSeries.ts2db, [None, .8, .1, .1, input_index, 1, None], standard, save_result=True)
+    root = t.add_operator(TimeSeries.cubic_root, [], read)
+    t.add_operator(TimeSeries.logarithm, [], root, save_result=True)
+    t.add_operator(TimeSeries.ts2db, [None, .8, .1, .1, 5, 1, None], root, save_result=True)
+    t.add_operator(TimeSeries.difference, [], read, save_result=True)
+    return t
+
+
+def assert_same_results(results, expected):
+    assert [node for _, node in results] == [node for _, node in expected]
+    for (result, _), (expected_result, _) in zip(results, expected):
+        if isinstance(expected_result, TimeSeries):
+            pd.testing.assert_frame_equal(result.data, expected_result.data)
+        else:
+            assert len(result) == len(expected_result)
+            for matrix, expected_matrix in zip(result, expected_result):
+                assert (matrix == expected_matrix).all()
+
+
+@pytest.mark.parametrize("executor", ["thread", "process", "async"])
+def test_executor_matches_sequential(executor):
+    t = build_tree()
+    t.execute_tree()
+    expected = t.results
+
+    t.execute_tree(executor=executor, max_workers=2)
+    assert t.errors == []
+    assert_same_results(t.results, expected)
+
+
+def fail(timeseries):
+    raise ValueError("failing branch")
+
+
+def keep(timeseries, *args):
+    return timeseries
+
+
+def operator_keys():
+    input_keys = dict(operatorkeys.operator_input_keys)
+    output_keys = dict(operatorkeys.operator_output_keys)
+    input_keys[fail], output_keys[fail] = ["timeseries_data"], []
+    input_keys[keep], output_keys[keep] = ["timeseries_data"], ["timeseries_data"]
+    return input_keys, output_keys
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_failing_branch_doesnt_stop_its_siblings(executor):
+    t = build_tree(*operator_keys())
+    t.execute_tree()
+    expected = t.results
+    failing = t.add_operator(fail, [], t.root.children[0].children[0])
+
+    t.execute_tree(executor=executor)
+    assert [(type(error), node) for error, node in t.errors] == [(ValueError, failing)]
+    assert_same_results(t.results, expected)
+
+
+def test_process_branches_dont_need_the_rest_of_the_tree():
+    t = build_tree(*operator_keys())
+    t.execute_tree()
+    expected = t.results
+    # A lock can't be pickled, so only the branch holding it can't be sent to a worker process
+    unpicklable = t.add_operator(keep, [threading.Lock()], t.root.children[0])
+    t.add_operator(TimeSeries.difference, [], unpicklable, save_result=True)
+
+    t.execute_tree(executor="process")
+    assert [node for _, node in t.errors] == [unpicklable]
+    assert_same_results(t.results, expected)
+
+
+def test_thread_siblings_run_at_the_same_time_below_the_first_fork():
+    # Each of the two siblings waits for the other, so they only finish if they run at the same time
+    barrier = threading.Barrier(2, timeout=10)
+
+    def wait_for_sibling(timeseries):
+        barrier.wait()
+        return timeseries
+
+    input_keys = dict(operatorkeys.operator_input_keys)
+    output_keys = dict(operatorkeys.operator_output_keys)
+    input_keys[wait_for_sibling], output_keys[wait_for_sibling] = ["timeseries_data"], ["timeseries_data"]
+    t = build_tree(input_keys, output_keys)
+    standard = t.root.children[0].children[0]
+    waiting = [t.add_operator(wait_for_sibling, [], standard, save_result=True) for _ in range(2)]
+
+    t.execute_tree(executor="thread", max_workers=4)
+    assert t.errors == []
+    assert [node for _, node in t.results if node in waiting] == waiting
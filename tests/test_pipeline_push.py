@@ -0,0 +1,79 @@
+'''
+Tests for Pipeline.push on a pipeline ending with a model: read_from_file -> ts2db -> rf_model -> fit -> predict -> mse.
+'''
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import modelingAndForecasting as mf
+import operatorkeys
+import preprocessing
+import tree
+import visualization as vs
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+INPUT_INDEX = 10
+
+
+def build_pipeline(history_file):
+    t = tree.TransformationTree(operatorkeys.operator_input_keys, operatorkeys.operator_output_keys,
+                                operatorkeys.operator_inplace_keys,
+                                update_functions=operatorkeys.operator_update_functions,
+                                window_keys=operatorkeys.operator_window_keys)
+    read = t.add_operator(preprocessing.TimeSeries.read_from_file, [history_file], t.root)
+    ts2db = t.add_operator(preprocessing.TimeSeries.ts2db, [None, 0.8, 0.1, 0.1, INPUT_INDEX, 1, None], read)
+    fit = t.add_operator(mf.fit, [], t.add_operator(mf.rf_model, [], ts2db))
+    mse = t.add_operator(vs.mse, [], t.add_operator(mf.predict, [], fit), save_result=True)
+    return t.export_pipeline(mse), ts2db, fit
+
+
+def test_push_smaller_than_window(tmp_path):
+    rows = pd.read_csv(DATA_FILE)
+    history_file = str(tmp_path / "history.csv")
+    rows.iloc[:500].to_csv(history_file, index=False)
+    pipeline, ts2db, fit = build_pipeline(history_file)
+
+    results = pipeline.push(rows.iloc[500:505])
+    trained_model = pipeline.models[fit]
+
+    # 5 new rows are fewer than a window of INPUT_INDEX + 1 values, but each of them ends a window
+    assert len(results) == 1 and np.isfinite(results[0][0])
+    assert pipeline.windows[ts2db].shape == (INPUT_INDEX,)
+    np.testing.assert_array_equal(pipeline.windows[ts2db], rows.iloc[495:505, -1].to_numpy())
+    # The model trained on the history is updated rather than replaced, and keeps its size
+    assert len(trained_model.estimators_) == mf.rf_model().n_estimators
+
+    results = pipeline.push(rows.iloc[505:506])
+    assert np.isfinite(results[0][0])
+    assert pipeline.models[fit] is trained_model
+
+
+def fit_forest(x_train, y_train):
+    return mf.rf_model().fit(x_train, np.ravel(y_train))
+
+
+def test_push_updates_declared_operators(tmp_path):
+    rows = pd.read_csv(DATA_FILE)
+    history_file = str(tmp_path / "history.csv")
+    rows.iloc[:500].to_csv(history_file, index=False)
+    input_keys, output_keys = dict(operatorkeys.operator_input_keys), dict(operatorkeys.operator_output_keys)
+    input_keys[fit_forest], output_keys[fit_forest] = ["x_train", "y_train"], ["trained_model"]
+    update_functions = dict(operatorkeys.operator_update_functions)
+    update_functions[fit_forest] = (mf.update, ["x_train", "y_train"])
+    t = tree.TransformationTree(input_keys, output_keys, operatorkeys.operator_inplace_keys,
+                                update_functions=update_functions, window_keys=operatorkeys.operator_window_keys)
+    read = t.add_operator(preprocessing.TimeSeries.read_from_file, [history_file], t.root)
+    ts2db = t.add_operator(preprocessing.TimeSeries.ts2db, [None, 0.8, 0.1, 0.1, INPUT_INDEX, 1, None], read)
+    fit = t.add_operator(fit_forest, [], ts2db)
+    update = t.add_operator(mf.update, [], fit)
+    pipeline = t.export_pipeline(t.add_operator(vs.mse, [], t.add_operator(mf.predict, [], update), save_result=True))
+
+    pipeline.push(rows.iloc[500:505])
+    models = {node: pipeline.models[node] for node in (fit, update)}
+    pipeline.push(rows.iloc[505:510])
+    assert all(pipeline.models[node] is model for node, model in models.items())
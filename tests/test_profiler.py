@@ -0,0 +1,31 @@
+'''
+Tests for the memory tracking of profiling.Profiler.
+'''
+
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import profiling
+
+
+@pytest.mark.parametrize("reset_peak", [True, False])
+def test_peak_memory_of_a_node(monkeypatch, reset_peak):
+    if not reset_peak:
+        # Python 3.8 doesn't have tracemalloc.reset_peak
+        monkeypatch.delattr(tracemalloc, "reset_peak", raising=False)
+    profiler = profiling.Profiler(track_memory=True)
+    try:
+        token = profiler.start()
+        values = np.ones(10 ** 6)
+        del values
+        record = profiler.stop(token, [], None, False)
+    finally:
+        tracemalloc.stop()
+
+    assert 8 * 10 ** 6 <= record["peak_memory"] < 9 * 10 ** 6
@@ -0,0 +1,92 @@
+'''
+Tests for tree.save and tree.load round trips of trees and pipelines, with results stored in the saved file or as blobs.
+'''
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import operatorkeys
+import preprocessing
+import tree
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+OTHER_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "3_passengers_train.csv")
+
+
+def build_tree(data_file):
+    t = tree.TransformationTree(operatorkeys.operator_input_keys, operatorkeys.operator_output_keys,
+                                operatorkeys.operator_inplace_keys, operatorkeys.operator_io_bound,
+                                operatorkeys.operator_budget_keys, operatorkeys.operator_update_functions,
+                                operatorkeys.operator_window_keys)
+    read = t.add_operator(preprocessing.TimeSeries.read_from_file, [data_file], t.root, tag="read")
+    scaled = t.add_operator(preprocessing.TimeSeries.scaling, [], read, tag="scaled", save_result=True)
+    t.add_operator(preprocessing.TimeSeries.standardize, [], read, tag="standard", save_result=True)
+    t.add_operator(preprocessing.TimeSeries.logarithm, [], scaled, tag="log")
+    return t
+
+
+def assert_same_tree(loaded, saved):
+    loaded_nodes, saved_nodes = [loaded.root], [saved.root]
+    while saved_nodes:
+        loaded_node, saved_node = loaded_nodes.pop(), saved_nodes.pop()
+        assert (loaded_node.operator, loaded_node.args, loaded_node.tag, loaded_node.save_result) == \
+            (saved_node.operator, saved_node.args, saved_node.tag, saved_node.save_result)
+        assert len(loaded_node.children) == len(saved_node.children)
+        loaded_nodes.extend(loaded_node.children)
+        saved_nodes.extend(saved_node.children)
+    assert loaded.get_nodes_by_tag("log")[0].parent is loaded.get_nodes_by_tag("scaled")[0]
+    assert loaded.inplace_keys == saved.inplace_keys and loaded.budget_keys == saved.budget_keys
+    assert loaded.io_operators == saved.io_operators
+    assert loaded.update_functions == saved.update_functions and loaded.window_keys == saved.window_keys
+
+
+def assert_same_results(loaded, saved):
+    assert len(loaded) == len(saved)
+    for (loaded_result, loaded_node), (saved_result, saved_node) in zip(loaded, saved):
+        assert loaded_node.tag == saved_node.tag
+        pd.testing.assert_frame_equal(loaded_result.data, saved_result.data)
+
+
+def test_round_trip_tree(tmp_path):
+    t = build_tree(DATA_FILE)
+    t.execute_tree()
+    filename = str(tmp_path / "tree.sav")
+
+    assert tree.save(t, filename)
+    loaded = tree.load(filename)
+    assert_same_tree(loaded, t)
+    assert_same_results(loaded.results, t.results)
+
+    assert tree.save(t, filename, results=False)
+    assert len(tree.load(filename).results) == 0
+
+
+def test_blobs_of_two_saves_in_one_directory(tmp_path):
+    blob_dir = str(tmp_path / "blobs")
+    trees = {}
+    for name, data_file in (("a", DATA_FILE), ("b", OTHER_FILE)):
+        t = build_tree(data_file)
+        t.execute_tree()
+        assert tree.save(t, str(tmp_path / f"{name}.sav"), blob_dir=blob_dir)
+        trees[name] = t
+
+    assert len(os.listdir(blob_dir)) == 4
+    for name, t in trees.items():
+        assert_same_results(tree.load(str(tmp_path / f"{name}.sav")).results, t.results)
+
+
+def test_round_trip_pipeline(tmp_path):
+    t = build_tree(DATA_FILE)
+    pipeline = t.export_pipeline(t.get_nodes_by_tag("standard")[0])
+    pipeline.run_path()
+    filename = str(tmp_path / "pipeline.sav")
+
+    assert tree.save(pipeline, filename, blob_dir=str(tmp_path))
+    loaded = tree.load(filename)
+    assert isinstance(loaded, tree.Pipeline) and loaded.end_node.tag == "standard"
+    assert_same_tree(loaded.tree, pipeline.tree)
+    assert_same_results(loaded.results, pipeline.results)
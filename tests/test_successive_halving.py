@@ -0,0 +1,87 @@
+'''
+Tests for TransformationTree.successive_halving: the budgets and survivors of every round, and the evenly spaced rows
+the operators declared in budget_keys train on.
+'''
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import operatorkeys
+import preprocessing
+import tree
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+TimeSeries = preprocessing.TimeSeries
+
+
+def score(x_train, y_train, offset):
+    '''
+    Scores a branch by offset alone, and reports the training rows it got
+    '''
+    return offset, len(x_train), len(y_train), y_train[-1, 0]
+
+
+def build_tree(branches, budget_keys=None):
+    '''
+    read -> standardize -> ts2db -> score x branches, saving every score
+    '''
+    input_keys = dict(operatorkeys.operator_input_keys)
+    output_keys = dict(operatorkeys.operator_output_keys)
+    input_keys[score], output_keys[score] = ["x_train", "y_train"], []
+    if budget_keys is None:
+        budget_keys = {score: ["x_train", "y_train"]}
+    t = tree.TransformationTree(input_keys, output_keys, operatorkeys.operator_inplace_keys, budget_keys=budget_keys)
+    read = t.add_operator(TimeSeries.read_from_file, [DATA_FILE], t.root)
+    standard = t.add_operator(TimeSeries.standardize, [], read)
+    db = t.add_operator(TimeSeries.ts2db, [None, .8, .1, .1, 3, 1, None], standard)
+    # Branch 0 scores best, branch 1 second best and so on
+    nodes = [t.add_operator(score, [offset], db, save_result=True) for offset in reversed(range(branches))]
+    return t, nodes[::-1]
+
+
+def test_rounds_keep_the_best_third_with_three_times_the_budget():
+    t, nodes = build_tree(9)
+    best, rounds = t.successive_halving()
+
+    assert [r["budget"] for r in rounds] == pytest.approx([1 / 9, 1 / 3, 1.0])
+    assert [[node for _, node in r["scores"]] for r in rounds] == [nodes, nodes[:3], nodes[:1]]
+    assert best is nodes[0]
+    assert t.budget == 1.0
+    # ts2db with input_index 3 makes 1197 training rows from the first 1200 values
+    assert [r["scores"][0][0][1:3] for r in rounds] == [(133, 133), (399, 399), (1197, 1197)]
+    assert len({r["scores"][0][0][3] for r in rounds}) == 1
+
+
+def test_single_survivor_runs_with_the_whole_data():
+    t, nodes = build_tree(4)
+    best, rounds = t.successive_halving(eta=2, min_budget=.1)
+
+    assert [r["budget"] for r in rounds] == pytest.approx([.1, .2, 1.0])
+    assert [len(r["scores"]) for r in rounds] == [4, 2, 1]
+    assert best is nodes[0]
+
+
+def test_subsample_is_evenly_spaced_and_ends_with_the_last_row():
+    values = np.arange(20).reshape(10, 2)
+
+    np.testing.assert_array_equal(tree._subsample(values, 1 / 3), values[[0, 3, 6, 9]])
+    np.testing.assert_array_equal(tree._subsample(values, 1.0), values)
+    assert np.shares_memory(tree._subsample(values, .5), values)
+    frame = pd.DataFrame(values)
+    pd.testing.assert_frame_equal(tree._subsample(frame, .25), frame.iloc[[1, 5, 9]])
+    assert tree._subsample(list(range(10)), .5) == [1, 3, 5, 7, 9]
+
+
+def test_successive_halving_needs_budget_keys_and_eta():
+    t, _ = build_tree(3, budget_keys={})
+    with pytest.raises(ValueError):
+        t.successive_halving()
+    t, _ = build_tree(3)
+    with pytest.raises(ValueError):
+        t.successive_halving(eta=1)
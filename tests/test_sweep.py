@@ -0,0 +1,98 @@
+'''
+Tests for TransformationTree.sweep: a grid runs as virtual branches generated one at a time, without adding nodes to
+the tree, and each branch matches a tree built with its args.
+'''
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import operatorkeys
+import preprocessing
+import tree
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+TimeSeries = preprocessing.TimeSeries
+
+
+def distance_to_three(x_train, y_train):
+    return abs(x_train.shape[1] - 3)
+
+
+def build_tree(ts2db_args=(None, .8, .1, .1, 2, 1, None)):
+    '''
+    read -> standardize -> ts2db -> distance_to_three, saving the distance
+    '''
+    input_keys = dict(operatorkeys.operator_input_keys)
+    output_keys = dict(operatorkeys.operator_output_keys)
+    input_keys[distance_to_three], output_keys[distance_to_three] = ["x_train", "y_train"], []
+    t = tree.TransformationTree(input_keys, output_keys, operatorkeys.operator_inplace_keys)
+    read = t.add_operator(TimeSeries.read_from_file, [DATA_FILE], t.root)
+    standard = t.add_operator(TimeSeries.standardize, [], read)
+    db = t.add_operator(TimeSeries.ts2db, list(ts2db_args), standard, tag="db")
+    t.add_operator(distance_to_three, [], db, save_result=True)
+    return t, db
+
+
+def test_sweep_records_every_combination_in_grid_order():
+    t, db = build_tree()
+    args = list(db.args)
+    best, records = t.sweep(db, {4: [2, 3, 4, 5], 5: [1, 2]})
+
+    assert [(record["args"][4], record["args"][5]) for record in records] == \
+        [(2, 1), (2, 2), (3, 1), (3, 2), (4, 1), (4, 2), (5, 1), (5, 2)]
+    assert [record["score"] for record in records] == [1, 1, 0, 0, 1, 1, 2, 2]
+    assert best is records[2]
+    # The sweep neither changes the node nor adds branches to the tree
+    assert db.args == args and len(db.children) == 1
+    assert t.results == [] and t.errors == []
+
+
+def test_sweep_branch_matches_a_tree_built_with_its_args():
+    t, db = build_tree()
+    _, records = t.sweep(db, {4: [3, 4]})
+
+    for record in records:
+        expected, _ = build_tree(record["args"])
+        expected.execute_tree()
+        assert [result for result, _ in record["results"]] == [result for result, _ in expected.results]
+
+
+def test_sweep_generates_combinations_one_at_a_time(monkeypatch):
+    generated = []
+    seen = []
+    grid_args = tree._grid_args
+
+    def recording_grid_args(node, grid):
+        for args in grid_args(node, grid):
+            generated.append(args)
+            yield args
+
+    def count_generated(x_train, y_train):
+        seen.append(len(generated))
+        return 0
+
+    monkeypatch.setattr(tree, "_grid_args", recording_grid_args)
+    t, db = build_tree()
+    t.input_keys[count_generated], t.output_keys[count_generated] = ["x_train", "y_train"], []
+    t.add_operator(count_generated, [], db)
+    t.sweep(db, {4: [2, 3, 4]})
+
+    assert seen == [1, 2, 3]
+
+
+def test_grid_args_doesnt_expand_the_grid():
+    t, db = build_tree()
+    combinations = tree._grid_args(db, {4: range(10 ** 6), 5: range(10 ** 6)})
+
+    assert next(combinations)[4:6] == [0, 0]
+    assert next(combinations)[4:6] == [0, 1]
+
+
+def test_sweep_rejects_positions_out_of_range():
+    t, db = build_tree()
+    with pytest.raises(ValueError):
+        t.sweep(db, {len(db.args): [1]})
@@ -0,0 +1,43 @@
+'''
+Tests for warm-start fitting with a ModelRegistry shared by the fit nodes of replicated branches.
+'''
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import modelingAndForecasting as mf
+import operatorkeys
+import preprocessing
+import tree
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "Time Series Data", "1_temperature_train.csv")
+
+
+def test_replicated_fit_branches_warm_start_from_each_other():
+    registry = mf.ModelRegistry()
+    t = tree.TransformationTree(operatorkeys.operator_input_keys, operatorkeys.operator_output_keys,
+                                operatorkeys.operator_inplace_keys)
+    read = t.add_operator(preprocessing.TimeSeries.read_from_file, [DATA_FILE], t.root)
+    ts2db = t.add_operator(preprocessing.TimeSeries.ts2db, [None, .8, .1, .1, 3, 1, None], read)
+    fit = t.add_operator(mf.fit, [registry], t.add_operator(mf.rf_model, [], ts2db), save_result=True)
+    replica = t.replicate_subtree(ts2db)
+    t.execute_tree()
+
+    replica_fit = replica.children[0].children[0]
+    assert replica_fit.args[0] is registry
+    (first, first_node), (second, second_node) = t.results
+    assert (first_node, second_node) == (fit, replica_fit)
+    # The replica's forest replaced the oldest quarter of the first branch's trees and kept the others
+    kept = len(first.estimators_) // 4
+    assert len(second.estimators_) == len(first.estimators_)
+    for old_tree, new_tree in zip(first.estimators_[kept:], second.estimators_):
+        np.testing.assert_array_equal(old_tree.tree_.threshold, new_tree.tree_.threshold)
+
+
+def test_empty_registry_is_true():
+    registry = mf.ModelRegistry()
+    assert registry and [registry] == ([registry] if registry else [])
@@ -6,10 +6,22 @@ Groupname: The Classy Coders
 Most recent modification: 2/9/2021
 """
 
+import asyncio
+import importlib
+import inspect
+import io
+import itertools
+import math
+import os
 import pickle
-from copy import deepcopy
-from queue import Queue
+import uuid
+from collections import ChainMap, deque
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from copy import copy, deepcopy
+import numpy as np
 import preprocessing
+import cache
 
 class CompatibilityError(Exception):
     """ 
@@ -18,8 +30,71 @@ class CompatibilityError(Exception):
     """
     pass
 
+class BranchState:
+    """
+    Branch specific dictionary used during tree execution. A child's state is layered on top of its parent's,
+    so values created higher up in the tree are shared between branches instead of copied. A shared value is
+    only copied when an operator is about to modify it in place (see BranchState.writable).
+    """
+    def __init__(self, parent=None):
+        """
+        Creates an empty BranchState, or a new layer on top of parent.
+
+        Args:
+            parent (BranchState, optional): State whose values are shared by the new state. Defaults to None.
+        """
+        self.values = ChainMap() if parent is None else parent.values.new_child()
+        # Content addresses of the values, used by cache.ResultCache
+        self.digests = ChainMap() if parent is None else parent.digests.new_child()
+
+    def child(self):
+        """
+        Returns:
+            BranchState: New state sharing every value of this state
+        """
+        return BranchState(self)
+
+    def writable(self, key):
+        """
+        Returns the value stored under key so that it can be modified in place.
+        Values inherited from a parent state are copied into this state first, leaving the other branches untouched.
+
+        Args:
+            key (str): Key of the value
+
+        Returns:
+            Any: Value owned by this state
+        """
+        own_values = self.values.maps[0]
+        if key not in own_values:
+            own_values[key] = deepcopy(self.values[key])
+        return own_values[key]
+
+    def digest(self, key):
+        """
+        Args:
+            key (str): Key of the value
+
+        Returns:
+            str: Content address of the value stored under key, or "" if it's unknown
+        """
+        return self.digests.get(key, "")
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __setitem__(self, key, value):
+        self.values[key] = value
+
+
 class Node:
     """ Node class used inside TransformationTree class """
+    # Without a per-instance __dict__ a node takes a fraction of the memory, which adds up in trees of many thousand nodes
+    __slots__ = ("operator", "tag", "args", "parent", "children", "save_result")
+
     def __init__(self, operator, args, parent=None, tag="", save_result=False):
         """
         Initializes a Node object containing operator, tag, args, parent, children, and save_result attributes
@@ -39,24 +114,53 @@ class Node:
         self.args = args
         # Parent node of this node
         self.parent = parent
-        # list of children nodes
-        self.children = []
+        # list of children nodes. Leaves share an empty tuple until their first child is added, see self.add_child
+        self.children = ()
         # Whether or not the result of executing the stored operator is added to the tree.results list in the TransformationTree object
         # The results attribute in the TransformationTree object is a non branch-specific list used to access the results of executing specific operators after the entire
         # tree has finished executing
         self.save_result = save_result
     
-    def apply_operator(self, dynamic_data: list):
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in Node.__slots__)
+
+    def __setstate__(self, state):
+        # Nodes pickled before __slots__ was added stored their attributes as a dict
+        if isinstance(state, dict):
+            state = tuple(state.get(name) for name in Node.__slots__)
+        for name, value in zip(Node.__slots__, state):
+            setattr(self, name, value)
+        if self.children is None:
+            self.children = ()
+        if self.save_result is None:
+            self.save_result = False
+
+    def add_child(self, child):
+        """
+        Appends a node to self.children.
+
+        Args:
+            child (Node): Node to append
+        """
+        if self.children:
+            self.children.append(child)
+        else:
+            self.children = [child]
+
+    def apply_operator(self, dynamic_data: list, args=None):
         """
         Calls self.operator, passing in the values contained in dynamic_data and self.args as positional arguments
 
         Args:
             dynamic_data (list): [description]
+            args (list, optional): Positional arguments used instead of self.args, e.g. by TransformationTree.sweep. Defaults to None.
 
         Returns:
             Any: The result of calling self.operator
         """
-        return self.operator(*dynamic_data, *self.args)
+        if args is None:
+            args = self.args
+        return self.operator(*dynamic_data, *args)
 
     def __str__(self):
         """
@@ -85,66 +189,567 @@ class Node:
             return f"Node({op_string})"
 
 class TransformationTree:
-    def __init__(self, input_keys, output_keys):
+    def __init__(self, input_keys, output_keys, inplace_keys=None, io_operators=None, budget_keys=None,
+                 update_functions=None, window_keys=None):
         """
-        Creates a TransformationTree object, initializing results, root, input_keys, and output_keys attributes in the object.
+        Creates a TransformationTree object, initializing results, root, input_keys, output_keys, inplace_keys, and io_operators attributes in the object.
 
         Args:
             input_keys (dict): Describes which key value pairs should be pulled from a branch specific dictionary and used as input during an operator's
             execution. Keys in this dict are operator functions, and values are lists of strings (used as keys in the branch dictionary to get input values).
             output_keys (dict): Describes how an operator's output should be stored in a branch specific dictionary after execution. Keys in this dict are operator functions,
             and values are lists of strings (used as keys in the branch dictionary to store output values).
+            inplace_keys (dict, optional): Declares which input values an operator modifies in place. Keys in this dict are operator functions,
+            and values are lists of input keys. These values are copied before the operator runs if they're shared with other branches.
+            Operators missing from the dict are assumed to modify all of their inputs. Defaults to None (no declarations).
+            io_operators (list, optional): Operator functions that mostly wait on files (e.g. read_from_file, write_to_file).
+            The "async" executor runs them on a separate pool so they overlap with compute. Defaults to None (no I/O operators).
+            budget_keys (dict, optional): Declares which inputs of an operator are cut down to a self.budget fraction of their
+            rows, e.g. the training data of fit. Keys in this dict are operator functions, and values are lists of input keys.
+            Used by self.successive_halving. Defaults to None (no declarations).
+            update_functions (dict, optional): Declares the operators producing a model that Pipeline.push updates with new
+            rows instead of running them again, e.g. fit. Keys in this dict are operator functions, and values are
+            (update function, input keys) pairs: the function is called with the model trained so far followed by the
+            values of the input keys. Defaults to None (no declarations).
+            window_keys (dict, optional): Declares the operators building sliding windows of a time series from their
+            input_index and output_index args, e.g. ts2db, whose windows Pipeline.push builds itself. Keys in this dict
+            are operator functions, and values are lists of output keys receiving the windows as (x, y) pairs.
+            Defaults to None (no declarations).
         """
         self.results = []
+        # (exception, node) pairs of branches that failed during a parallel execution
+        self.errors = []
         self.root = Node(preprocessing.TimeSeries,[], tag="root")
-        self.root.children = []
         self.input_keys = input_keys
         self.output_keys = output_keys
+        self.inplace_keys = inplace_keys if inplace_keys is not None else {}
+        self.io_operators = set(io_operators) if io_operators is not None else set()
+        self.budget_keys = budget_keys if budget_keys is not None else {}
+        self.update_functions = update_functions if update_functions is not None else {}
+        self.window_keys = window_keys if window_keys is not None else {}
+        # Fraction of their rows the inputs declared in self.budget_keys keep when a node executes, see _subsample
+        self.budget = 1.0
+        # Optional cache.ResultCache used to skip nodes whose operator, args and inputs didn't change since a previous execution
+        self.cache = None
+        # Content address of each node from the most recent execution with a cache
+        self.node_digests = {}
+        # Optional profiling.Profiler recording the cost of every node execution
+        self.profiler = None
+        self._rebuild_indexes()
+
+    def __getstate__(self):
+        # The indexes only hold references to the nodes, so they're rebuilt instead of pickled
+        state = self.__dict__.copy()
+        for name in _INDEX_ATTRIBUTES:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Trees pickled by older versions don't have the attributes added since
+        self.__dict__.setdefault("errors", [])
+        self.__dict__.setdefault("inplace_keys", {})
+        self.__dict__.setdefault("io_operators", set())
+        self.__dict__.setdefault("budget_keys", {})
+        self.__dict__.setdefault("update_functions", {})
+        self.__dict__.setdefault("window_keys", {})
+        self.__dict__.setdefault("budget", 1.0)
+        self.__dict__.setdefault("cache", None)
+        self.__dict__.setdefault("node_digests", {})
+        self.__dict__.setdefault("profiler", None)
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self):
+        """
+        Builds the tag and operator indexes and the available keys of every node in the tree from scratch.
+        """
+        # tag -> {node: None}, an insertion ordered set of the nodes with the tag
+        self._tag_index = {}
+        # operator -> {node: None}
+        self._operator_index = {}
+        # node -> frozenset of the branch dictionary keys created by the node and the nodes above it
+        self._key_sets = {}
+        # (parent's key set, operator) -> key set of the node
+        self._key_set_pool = {}
+        self._index_subtree(self.root)
+
+    def _index_subtree(self, subtree_root):
+        """
+        Adds the nodes of a subtree to the indexes, and (re)computes their available keys from their parents'.
+        Nodes that are already indexed keep their place in the indexes.
 
-    def _execute(self, path=None):
+        Args:
+            subtree_root (Node): Root of the subtree, whose parent (if any) is already indexed.
+        """
+        stack = [subtree_root]
+        while stack:
+            node = stack.pop()
+            self._tag_index.setdefault(node.tag, {})[node] = None
+            self._operator_index.setdefault(node.operator, {})[node] = None
+            parent_keys = self._key_sets[node.parent] if node.parent is not None else frozenset()
+            # Branches repeat the same few sets of keys, so equal sets are shared by all the nodes having them
+            key_set = self._key_set_pool.get((parent_keys, node.operator))
+            if key_set is None:
+                key_set = parent_keys.union(self.output_keys[node.operator])
+                key_set = self._key_set_pool.setdefault((parent_keys, node.operator), key_set)
+            self._key_sets[node] = key_set
+            stack.extend(reversed(node.children))
+
+    def _unindex_node(self, node):
+        """
+        Removes a single node from the indexes, e.g. once it's been detached from the tree.
+
+        Args:
+            node (Node): Node to remove.
+        """
+        for index, value in ((self._tag_index, node.tag), (self._operator_index, node.operator)):
+            nodes = index.get(value)
+            if nodes is not None:
+                nodes.pop(node, None)
+                if not nodes:
+                    del index[value]
+        self._key_sets.pop(node, None)
+
+    def _execute(self, path=None, executor=None, max_workers=None):
         """
         Generic tree execution method called by self.execute_tree and self.execute_path.
-        Modifies self.results.
+        Modifies self.results, self.errors and self.node_digests, and adds records to self.profiler.
 
         Args:
             path (list, optional): List of nodes in a path to execute. If None whole tree will be executed. Defaults to None.
+            executor (str or Executor, optional): "thread", "process", "async" or a concurrent.futures.Executor used to run sibling
+            branches at the same time. If None the tree is executed sequentially. Defaults to None.
+            max_workers (int, optional): Number of workers in the pool created for executor. Defaults to None.
         """
         self.results = []
-        q = Queue()
-        q.put((self.root, {}))
-        while not q.empty():
-            node, branch_dict = q.get()
-            dynamic_values = []
-            # Getting dynamic values from branch dict
-            for key in self.input_keys[node.operator]:
-                if key in branch_dict:
-                    dynamic_values.append(branch_dict[key])
-            # Checking if all the required input data was created by previous operators
-            if len(self.input_keys[node.operator]) == len(dynamic_values):
-                result = node.apply_operator(dynamic_values)
-                # Optionally saving the returned result to a list that can be viewed after tree execution
-                if node.save_result:
-                    self.results.append((result, node))
-                # Making result iterable
-                if result is None:
-                    result = []
-                elif type(result) != list and type(result) != tuple:
-                    result = [result]
-                # If the correct amount of data was returned, update the branch_dict and add node's children to queue
-                if len(result) == len(self.output_keys[node.operator]):
-                    for key, value in zip(self.output_keys[node.operator], result):
-                        branch_dict[key] = value
-                    for child in node.children:
-                        if path is None or child in path:
-                            q.put((child, deepcopy(branch_dict)))
-
-
-    def execute_tree(self):
+        self.errors = []
+        if path is not None:
+            path = set(path)
+        if executor is None:
+            log = self._execute_subtree(self.root, BranchState(), (), path, isolate_errors=False)
+        elif executor == "async":
+            log = asyncio.run(self._execute_async(path, max_workers))
+        else:
+            log = self._execute_parallel(path, executor, max_workers)
+        # Branches can finish in any order, so results are put back in the order a sequential run would produce
+        log.results.sort(key=_execution_order)
+        log.errors.sort(key=_execution_order)
+        self.results = [(result, self._resolve_node(key)) for key, result in log.results]
+        self.errors = [(error, self._resolve_node(key)) for key, error in log.errors]
+        for key, digest in log.digests:
+            self.node_digests[self._resolve_node(key)] = digest
+        self._record_profile(log)
+
+    def _execute_parallel(self, path, executor, max_workers):
+        """
+        Executes the shared prefix of the tree locally, then runs the branches below it on an executor.
+        On threads every node is submitted as soon as its parent finished, so sibling branches run at the same time at
+        every level of the tree. A worker process gets a whole branch below the first fork instead, and executes the
+        forks further down one after the other: sending the values of every node between processes would cost more
+        than running them in parallel saves.
+        A branch that raises an exception is recorded in the returned log's errors and doesn't stop its siblings.
+
+        Args:
+            path (set): Nodes to execute, or None for the whole tree.
+            executor (str or Executor): "thread", "process" or an existing concurrent.futures.Executor.
+            max_workers (int): Number of workers in the pool created for executor.
+
+        Returns:
+            _ExecutionLog: What happened while the tree executed
+        """
+        log = _ExecutionLog()
+        frontier = deque([(self.root, BranchState(), ())])
+        # Nodes above the first fork are shared by every branch, so there's nothing to run in parallel yet
+        while len(frontier) == 1:
+            node, branch_dict, key = frontier.popleft()
+            try:
+                frontier.extend(self._execute_node(node, branch_dict, key, path, log))
+            except Exception as error:
+                log.errors.append((key, error))
+        if not frontier:
+            return log
+
+        pool, owns_pool = make_executor(executor, max_workers)
+        try:
+            if isinstance(pool, ProcessPoolExecutor):
+                futures = [(key, self._submit_remote(pool, node, branch_dict, key, path))
+                           for node, branch_dict, key in frontier]
+                for key, future in futures:
+                    log.extend(self._store_returned(_future_log(key, future)))
+            else:
+                self._execute_nodes(pool, frontier, path, log)
+        finally:
+            if owns_pool:
+                pool.shutdown()
+        return log
+
+    def _execute_nodes(self, pool, tasks, path, log):
+        """
+        Executes (node, branch_dict, key) tasks and everything below them on a pool sharing this process's memory,
+        submitting each node once its parent finished. A node that raises an exception is recorded in log's errors
+        and stops its branch only.
+
+        Args:
+            pool (Executor): Pool running the nodes, e.g. a ThreadPoolExecutor.
+            tasks (iterable): (node, branch_dict, key) tasks to execute first.
+            path (set): Nodes to execute, or None for the whole tree.
+            log (_ExecutionLog): Log receiving what happened, shared by every node.
+        """
+        pending = {pool.submit(self._execute_node, node, branch_dict, key, path, log): key
+                   for node, branch_dict, key in tasks}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    children = future.result()
+                except Exception as error:
+                    log.errors.append((key, error))
+                    continue
+                for node, branch_dict, child_key in children:
+                    pending[pool.submit(self._execute_node, node, branch_dict, child_key, path, log)] = child_key
+
+    def _submit_remote(self, pool, node, branch_dict, key, path, start_args=None):
+        """
+        Submits the subtree below node to a pool of worker processes, see _execute_remote. Only the subtree is sent,
+        detached from the nodes above it, along with the tree's settings: the tree's other nodes, results and execution
+        records stay in this process. Worker processes have their own, empty copy of the cache, so they also get the
+        entries of their subtree, and send what they computed back to this one.
+
+        Args:
+            pool (ProcessPoolExecutor): Pool of worker processes.
+            node (Node): Root of the subtree.
+            branch_dict (BranchState): Values created above node.
+            key (tuple): Child indices leading from the root to node.
+            path (set): Nodes to execute, or None for the whole subtree.
+            start_args (list, optional): Args used instead of node.args, see self.sweep. Defaults to None.
+
+        Returns:
+            Future: Future of the subtree's _ExecutionLog, holding the error if the task couldn't be pickled
+        """
+        try:
+            settings = {name: value for name, value in self.__dict__.items() if name not in _LOCAL_ATTRIBUTES}
+            if self.profiler is not None:
+                # The worker's records come back in its log
+                settings["profiler"] = copy(self.profiler)
+                settings["profiler"].records = []
+            if path is not None:
+                subtree_path, stack = set(), [node]
+                while stack:
+                    current_node = stack.pop()
+                    if current_node in path:
+                        subtree_path.add(current_node)
+                        stack.extend(current_node.children)
+                path = subtree_path
+            entries = self._cached_entries(node, branch_dict, path, start_args)
+            task = io.BytesIO()
+            _SubtreePickler(task, node.parent).dump((settings, node, branch_dict, key, path, start_args, entries))
+        except Exception as error:
+            # e.g. a lambda operator or a value that can't be pickled
+            future = Future()
+            future.set_exception(error)
+            return future
+        return pool.submit(_execute_remote, task.getvalue())
+
+    async def _execute_async(self, path, max_workers):
+        """
+        Executes the tree with asyncio, overlapping I/O with compute. Every branch is scheduled as soon as its parent
+        finishes: operators in self.io_operators run on their own thread pool, everything else on a compute pool of
+        max_workers threads. While the compute pool trains one branch, the other branches' input files are already
+        being read (and their outputs written). A branch that raises doesn't stop the others.
+
+        Args:
+            path (set): Nodes to execute, or None for the whole tree.
+            max_workers (int): Number of compute threads. Defaults to 1 when None, so compute runs in the same order
+            and with the same memory use as a sequential execution.
+
+        Returns:
+            _ExecutionLog: What happened while the tree executed
+        """
+        log = _ExecutionLog()
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=max_workers or 1) as compute_pool, ThreadPoolExecutor() as io_pool:
+            async def execute_branch(node, branch_dict, key):
+                pool = io_pool if node.operator in self.io_operators else compute_pool
+                try:
+                    children = await loop.run_in_executor(pool, self._execute_node, node, branch_dict, key, path, log)
+                except Exception as error:
+                    log.errors.append((key, error))
+                    return
+                await asyncio.gather(*(execute_branch(*child) for child in children))
+
+            await execute_branch(self.root, BranchState(), ())
+        return log
+
+    def _execute_subtree(self, start_node, branch_dict, start_key, path, isolate_errors, start_args=None,
+                         cache_entries=None):
+        """
+        Executes the subtree below start_node breadth-first.
+
+        Args:
+            start_node (Node): First node to execute.
+            branch_dict (BranchState): Branch specific dictionary holding the values created above start_node.
+            start_key (tuple): Child indices leading from the root to start_node.
+            path (set): Nodes to execute, or None for the whole subtree.
+            isolate_errors (bool): If True an exception only stops the branch below the failing node, otherwise it's raised.
+            start_args (list, optional): Args used instead of start_node.args, see self.sweep. Defaults to None.
+            cache_entries (list, optional): (digest, blob) entries of the parent process's cache, given when the subtree
+            executes in a worker process (see self._cached_entries). New cache entries are then returned in the log
+            instead of stored, see self._store_returned. Defaults to None.
+
+        Returns:
+            _ExecutionLog: What happened while the subtree executed
+        """
+        log = _ExecutionLog()
+        if cache_entries is not None:
+            for digest, blob in cache_entries:
+                self.cache.put(digest, blob, disk=False)
+            log.cache_entries = []
+        q = deque([(start_node, branch_dict, start_key)])
+        while q:
+            node, branch_dict, key = q.popleft()
+            args = start_args if key == start_key else None
+            try:
+                q.extend(self._execute_node(node, branch_dict, key, path, log, args=args))
+            except Exception as error:
+                if not isolate_errors:
+                    raise
+                log.errors.append((key, error))
+        return log
+
+    def _execute_node(self, node, branch_dict, key, path, log, use_cache=True, args=None):
+        """
+        Applies a single node's operator to the values in its branch dictionary.
+        If self.cache is set, the operator's output is looked up by content address before running it,
+        and if self.profiler is set, the execution is timed and measured.
+
+        Args:
+            node (Node): Node to execute.
+            branch_dict (BranchState): Branch specific dictionary, updated with the operator's output.
+            key (tuple): Child indices leading from the root to node.
+            path (set): Nodes to execute, or None for every child.
+            log (_ExecutionLog): Log receiving saved results, cache digests and profiling records.
+            use_cache (bool, optional): If False self.cache is neither read nor written, for values whose digests
+            don't describe their content (see Pipeline.push). Defaults to True.
+            args (list, optional): Args used instead of node.args, see self.sweep. Defaults to None.
+
+        Returns:
+            list: (child, branch_dict, key) tasks for the children that should be executed next
+        """
+        if args is None:
+            args = node.args
+        input_keys = self.input_keys[node.operator]
+        output_keys = self.output_keys[node.operator]
+        # Checking if all the required input data was created by previous operators
+        if any(input_key not in branch_dict for input_key in input_keys):
+            return []
+        # Operators that aren't declared in self.inplace_keys are assumed to modify all of their inputs
+        declared_keys = self.inplace_keys.get(node.operator, input_keys)
+        inplace_keys = [input_key for input_key in input_keys if input_key in declared_keys]
+        budget_keys = self.budget_keys.get(node.operator, []) if self.budget < 1 else []
+
+        token = self.profiler.start() if self.profiler is not None else None
+        digest = None
+        result = _MISSING
+        # Operators without any output only run for their side effects (plots, files), so they're never cached
+        if self.cache is not None and use_cache and (output_keys or inplace_keys):
+            digest = self._node_digest(node, args, branch_dict.digests)
+            log.digests.append((key, digest))
+            result = self._load_cached(digest, branch_dict)
+        cache_hit = result is not _MISSING
+        if not cache_hit:
+            # Getting dynamic values from branch dict, copying the ones the operator modifies if they're shared
+            dynamic_values = [branch_dict.writable(input_key) if input_key in inplace_keys else branch_dict[input_key]
+                              for input_key in input_keys]
+            if budget_keys:
+                dynamic_values = [_subsample(value, self.budget) if input_key in budget_keys else value
+                                  for input_key, value in zip(input_keys, dynamic_values)]
+            result = node.apply_operator(dynamic_values, args)
+            if digest is not None:
+                self._store_cached(digest, result, {input_key: branch_dict[input_key] for input_key in inplace_keys}, log)
+        if token is not None:
+            inputs = [branch_dict[input_key] for input_key in input_keys]
+            log.profile.append((key, self.profiler.stop(token, inputs, result, cache_hit)))
+        if digest is not None:
+            for input_key in inplace_keys:
+                branch_dict.digests[input_key] = cache.value_digest(digest, input_key)
+
+        # Optionally saving the returned result to a list that can be viewed after tree execution
+        if node.save_result:
+            log.results.append((key, result))
+        # Making result iterable
+        if result is None:
+            result = []
+        elif type(result) != list and type(result) != tuple:
+            result = [result]
+        # If the correct amount of data was returned, update the branch_dict and return node's children
+        if len(result) != len(output_keys):
+            return []
+        for output_key, value in zip(output_keys, result):
+            branch_dict[output_key] = value
+            if digest is not None:
+                branch_dict.digests[output_key] = cache.value_digest(digest, output_key)
+        children = [(index, child) for index, child in enumerate(node.children) if path is None or child in path]
+        # A single child can keep modifying this state, but siblings (and saved results) must not see each other's changes
+        if len(children) == 1 and not node.save_result:
+            return [(children[0][1], branch_dict, key + (children[0][0],))]
+        return [(child, branch_dict.child(), key + (index,)) for index, child in children]
+
+    def _node_digest(self, node, args, digests):
+        """
+        Computes the content address of a node execution.
+
+        Args:
+            node (Node): Node to execute.
+            args (list): Args the node is called with.
+            digests (Mapping): Digests of the values in the branch dictionary, see BranchState.digests.
+
+        Returns:
+            str: The digest
+        """
+        # A node running on part of its inputs doesn't produce the output of a full run
+        if self.budget < 1 and self.budget_keys.get(node.operator):
+            args = list(args) + [("budget", self.budget)]
+        input_digests = [digests.get(input_key, "") for input_key in self.input_keys[node.operator]]
+        return cache.node_digest(node.operator, args, input_digests)
+
+    def _cached_entries(self, start_node, branch_dict, path, start_args=None):
+        """
+        Looks up the entries of self.cache a worker process can use to execute a subtree. The digests of the subtree's
+        nodes are computed from their operators, their args and the digests of the values created above start_node,
+        without executing anything. The lookups count as the cache's hits and misses, since the worker's copy of the
+        cache doesn't report them.
+
+        Args:
+            start_node (Node): Root of the subtree.
+            branch_dict (BranchState): Branch specific dictionary holding the values created above start_node.
+            path (set): Nodes to execute, or None for the whole subtree.
+            start_args (list, optional): Args used instead of start_node.args. Defaults to None.
+
+        Returns:
+            list: (digest, blob) entries of self.cache
+        """
+        entries = []
+        if self.cache is None:
+            return entries
+        q = deque([(start_node, branch_dict.digests, start_args)])
+        while q:
+            node, digests, args = q.popleft()
+            input_keys = self.input_keys[node.operator]
+            declared_keys = self.inplace_keys.get(node.operator, input_keys)
+            # Same rule as self._execute_node: only nodes creating or modifying values are cached
+            changed_keys = self.output_keys[node.operator] + [input_key for input_key in input_keys
+                                                              if input_key in declared_keys]
+            if changed_keys:
+                digest = self._node_digest(node, node.args if args is None else args, digests)
+                blob = self.cache.get(digest)
+                if blob is not None:
+                    entries.append((digest, blob))
+                digests = digests.new_child({key: cache.value_digest(digest, key) for key in changed_keys})
+            q.extend((child, digests, None) for child in node.children if path is None or child in path)
+        return entries
+
+    def _load_cached(self, digest, branch_dict):
+        """
+        Looks up a node's output in self.cache.
+
+        Args:
+            digest (str): Content address of the node execution.
+            branch_dict (BranchState): Receives the cached versions of the values the operator modified in place.
+
+        Returns:
+            Any: The operator's cached result, or _MISSING if it isn't cached
+        """
+        blob = self.cache.get(digest)
+        if blob is None:
+            return _MISSING
+        result, modified_values = pickle.loads(blob)
+        for input_key, value in modified_values.items():
+            branch_dict[input_key] = value
+        return result
+
+    def _store_cached(self, digest, result, modified_values, log):
+        """
+        Stores a node's output in self.cache. Outputs that can't be pickled are not cached.
+
+        Args:
+            digest (str): Content address of the node execution.
+            result (Any): Value returned by the operator.
+            modified_values (dict): Input values the operator modified in place, keyed by their branch dictionary keys.
+            log (_ExecutionLog): Log of the execution, which collects the entry instead if it has cache_entries.
+        """
+        try:
+            blob = pickle.dumps((result, modified_values), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if log.cache_entries is not None:
+            log.cache_entries.append((digest, blob))
+        else:
+            self.cache.put(digest, blob)
+
+    def _store_returned(self, log):
+        """
+        Stores the cache entries a worker process returned in self.cache.
+
+        Args:
+            log (_ExecutionLog): Log returned by the worker.
+
+        Returns:
+            _ExecutionLog: log, without its cache entries
+        """
+        if log.cache_entries:
+            for digest, blob in log.cache_entries:
+                self.cache.put(digest, blob)
+        log.cache_entries = None
+        return log
+
+    def _resolve_node(self, key):
+        """
+        Finds the node reached by following a tuple of child indices from the root.
+        Used to map results computed in other processes back onto this tree's nodes.
+
+        Args:
+            key (tuple): Child indices leading from the root to the node.
+
+        Returns:
+            Node: The node at the end of the key
+        """
+        node = self.root
+        for index in key:
+            node = node.children[index]
+        return node
+
+    def invalidate_cache(self, node):
+        """
+        Removes the cached outputs of a node and every node below it, as computed by the last execution,
+        so they are recomputed the next time the tree is executed.
+
+        Args:
+            node (Node): Root of the subtree to invalidate.
+        """
+        q = deque([node])
+        while q:
+            current_node = q.popleft()
+            digest = self.node_digests.pop(current_node, None)
+            if digest is not None and self.cache is not None:
+                self.cache.invalidate(digest)
+            q.extend(current_node.children)
+
+    def execute_tree(self, executor=None, max_workers=None):
         """
         Executes entire tree by calling self._execute() without a path argument.
-        Modifies self.results
+        Modifies self.results and self.errors
+
+        Args:
+            executor (str or Executor, optional): "thread" or "process" to run independent sibling branches at the same time
+            on a pool of max_workers, or an existing concurrent.futures.Executor. Threads do so at every level of the tree,
+            while a worker process executes a whole branch below the first fork (see self._execute_parallel). "async"
+            overlaps the operators in self.io_operators with compute running on max_workers threads. Results keep the
+            order of a sequential run, and a branch that fails is recorded in self.errors without stopping the others.
+            Defaults to None (sequential).
+            max_workers (int, optional): Size of the pool created for executor. Defaults to None.
         """
-        self._execute(path=None)
+        self._execute(path=None, executor=executor, max_workers=max_workers)
 
     def execute_path(self, end_node):
         """
@@ -155,17 +760,249 @@ class TransformationTree:
             end_node (Node): Last node in the path to be executed.
         """
         self.results = []
-        # Finding the path
+        self._execute(path=self._find_path(end_node))
+
+    def execute_paths(self, end_nodes, executor=None, max_workers=None):
+        """
+        Executes several paths in the tree as one execution plan. Nodes shared by more than one path
+        (e.g. read_from_file -> assign_time -> denoise) are only executed once and their output is shared by every path.
+        Modifies self.results and self.errors
+
+        Args:
+            end_nodes ([Node]): Last nodes of the paths to be executed.
+            executor (str or Executor, optional): See self.execute_tree. Defaults to None (sequential).
+            max_workers (int, optional): See self.execute_tree. Defaults to None.
+        """
+        path = set()
+        for end_node in end_nodes:
+            path.update(self._find_path(end_node))
+        self._execute(path=path, executor=executor, max_workers=max_workers)
+
+    def sweep(self, node, grid, metric_node=None, minimize=True, executor=None, max_workers=None):
+        """
+        Executes the subtree below node once for every combination of args in grid, without copying any node.
+        The nodes above node are executed once. Each combination then runs as a virtual branch sharing their output,
+        in which node is called with the combination's args and the rest of the subtree as it is. Combinations are
+        generated one at a time, so a large grid never exists as a list of branches.
+        self.results and self.errors are left unchanged.
+
+        Args:
+            node (Node): Node whose args are swept, e.g. a ts2db or model node.
+            grid (dict): Maps positions in node.args to lists of values, e.g. {4: [2, 3, 4]} for the input_index of ts2db.
+            metric_node (Node, optional): Node below node whose saved result scores a branch. Defaults to None (the first
+            node of the subtree with save_result).
+            minimize (bool, optional): Whether lower scores are better, as for mse. Defaults to True.
+            executor (str or Executor, optional): "thread", "process" or a concurrent.futures.Executor running branches at
+            the same time, see self.execute_tree. Only a few branches per worker are submitted ahead. Defaults to None (sequential).
+            max_workers (int, optional): Size of the pool created for executor. Defaults to None.
+
+        Returns:
+            tuple: (best, records). records holds one dict per combination in grid order, with the "args" node was called
+            with, the branch's "score", and its saved "results" and "errors" as (value, node) pairs. best is the record with
+            the best score, or None if no branch produced one.
+
+        Raises:
+            ValueError: If a position in grid is out of range of node.args
+        """
+        for position in grid:
+            if not -len(node.args) <= position < len(node.args):
+                raise ValueError(f"{node} has no argument at position {position}")
+        branch_dict, key = self._execute_prefix(node)
+        if branch_dict is None:
+            return None, []
+
+        records = []
+        for args, log in self._execute_variants(node, branch_dict, key, _grid_args(node, grid), executor, max_workers):
+            log.results.sort(key=_execution_order)
+            log.errors.sort(key=_execution_order)
+            results = [(result, self._resolve_node(result_key)) for result_key, result in log.results]
+            errors = [(error, self._resolve_node(error_key)) for error_key, error in log.errors]
+            scores = [result for result, result_node in results if metric_node is None or result_node is metric_node]
+            records.append({"args": args, "score": scores[0] if scores else None, "results": results, "errors": errors})
+            self._record_profile(log)
+
+        scored = [record for record in records if record["score"] is not None]
+        if not scored:
+            return None, records
+        choose = min if minimize else max
+        return choose(scored, key=lambda record: record["score"]), records
+
+    def successive_halving(self, end_nodes=None, eta=3, min_budget=None, minimize=True, executor=None, max_workers=None):
+        """
+        Finds the best of several branches without running all of them to completion, by successive halving.
+        Every branch first runs with a small budget: the operators in self.budget_keys only take a self.budget fraction of
+        their rows, evenly spaced, e.g. fit trains on every ninth row of the training data. The branches are ranked by
+        the saved result of their end node, the best 1/eta of them run again with eta times the budget, and so on until the
+        survivors run with the whole data. Nodes outside self.budget_keys, like preprocessing, run on all of their data in
+        every round, so set self.cache to execute them only once.
+        Modifies self.results and self.errors, which hold the last round's results.
+
+        Args:
+            end_nodes ([Node], optional): Nodes with save_result whose result scores their branch, e.g. mse nodes.
+            Defaults to None (every node with save_result).
+            eta (int, optional): Factor the number of branches is divided by, and the budget multiplied by, after each round.
+            Defaults to 3.
+            min_budget (float, optional): Budget of the first round, as a fraction of the rows. Defaults to None
+            (eta to the power of minus the number of rounds needed to keep a single branch).
+            minimize (bool, optional): Whether lower scores are better, as for mse. Defaults to True.
+            executor (str or Executor, optional): See self.execute_tree. Defaults to None (sequential).
+            max_workers (int, optional): See self.execute_tree. Defaults to None.
+
+        Returns:
+            tuple: (best, rounds). rounds holds one dict per round, with its "budget" and the "scores" of its branches as
+            (score, end node) pairs, best first. A branch that failed or didn't save a result has the score None and is
+            dropped. best is the end node of the best branch of the last round, which ran with the whole data, or None
+            if every branch failed.
+
+        Raises:
+            ValueError: If eta is smaller than 2, or no operator of the tree is declared in self.budget_keys
+        """
+        if eta < 2:
+            raise ValueError(f"eta must be at least 2, got {eta}")
+        if not self.budget_keys:
+            raise ValueError("Successive halving needs operators whose inputs can be cut down, see budget_keys")
+        if end_nodes is None:
+            end_nodes = self._get_saved_nodes()
+        candidates = list(end_nodes)
+        if min_budget is None:
+            min_budget = float(eta) ** -int(math.log(max(len(candidates), 1), eta) + 1e-9)
+
+        rounds = []
+        budget = min(min_budget, 1.0)
+        try:
+            while candidates:
+                self.budget = budget
+                self.execute_paths(candidates, executor, max_workers)
+                saved = {id(node): result for result, node in self.results}
+                scored = sorted(((saved[id(node)], node) for node in candidates if id(node) in saved),
+                                key=lambda score: score[0], reverse=not minimize)
+                failed = [(None, node) for node in candidates if id(node) not in saved]
+                rounds.append({"budget": budget, "scores": scored + failed})
+                if budget >= 1.0 or not scored:
+                    break
+                candidates = [node for _, node in scored[:max(len(scored) // eta, 1)]]
+                # A single survivor doesn't need to be compared any more, it only needs its score on the whole data
+                budget = 1.0 if len(candidates) == 1 else min(budget * eta, 1.0)
+        finally:
+            self.budget = 1.0
+
+        last_scores = rounds[-1]["scores"] if rounds else []
+        best = last_scores[0][1] if last_scores and last_scores[0][0] is not None else None
+        return best, rounds
+
+    def _get_saved_nodes(self):
+        """
+        Finds the nodes with save_result, in the breadth-first order their results are saved by a sequential execution.
+
+        Returns:
+            list: Node objects
+        """
+        result = []
+        q = deque([self.root])
+        while q:
+            node = q.popleft()
+            if node.save_result:
+                result.append(node)
+            q.extend(node.children)
+        return result
+
+    def _execute_prefix(self, node):
+        """
+        Executes the nodes on the path from the root to node, excluding node.
+
+        Args:
+            node (Node): First node that isn't executed.
+
+        Returns:
+            tuple: (BranchState holding the values node takes, or None if a node above didn't produce them, key of node)
+        """
+        path = self._find_path(node)[::-1]
+        key = tuple(parent.children.index(child) for parent, child in zip(path, path[1:]))
+        log = _ExecutionLog()
+        branch_dict = BranchState()
+        for index, current_node in enumerate(path[:-1]):
+            children = self._execute_node(current_node, branch_dict, key[:index], set(path), log)
+            if not children:
+                branch_dict = None
+                break
+            branch_dict = children[0][1]
+        self._record_profile(log)
+        return branch_dict, key
+
+    def _execute_variants(self, node, branch_dict, key, variants, executor, max_workers):
+        """
+        Executes the subtree below node once per list of args in variants, each on its own layer of branch_dict.
+
+        Args:
+            node (Node): Root of the subtree.
+            branch_dict (BranchState): Values node takes, shared by every variant.
+            key (tuple): Child indices leading from the root to node.
+            variants (iterable): Lists of args node is called with.
+            executor (str or Executor): See self.sweep, None to execute the variants sequentially.
+            max_workers (int): Size of the pool created for executor.
+
+        Yields:
+            tuple: (args, _ExecutionLog) for every variant, in order
+        """
+        if executor is None:
+            for args in variants:
+                yield args, self._execute_subtree(node, branch_dict.child(), key, None, True, args)
+            return
+
+        pool, owns_pool = make_executor(executor, max_workers)
+        remote = isinstance(pool, ProcessPoolExecutor)
+        window = 2 * (max_workers or os.cpu_count() or 1)
+        pending = deque()
+        try:
+            for args in variants:
+                if remote:
+                    future = self._submit_remote(pool, node, branch_dict.child(), key, None, args)
+                else:
+                    future = pool.submit(self._execute_subtree, node, branch_dict.child(), key, None, True, args)
+                pending.append((args, future))
+                if len(pending) >= window:
+                    args, future = pending.popleft()
+                    yield args, self._store_returned(_future_log(key, future))
+            while pending:
+                args, future = pending.popleft()
+                yield args, self._store_returned(_future_log(key, future))
+        finally:
+            if owns_pool:
+                pool.shutdown()
+
+    def _record_profile(self, log):
+        """
+        Adds the profiling records of an execution to self.profiler, in the order of a sequential execution.
+
+        Args:
+            log (_ExecutionLog): Log of the execution.
+        """
+        if self.profiler is None:
+            return
+        log.profile.sort(key=_execution_order)
+        for key, record in log.profile:
+            self.profiler.add(self.get_path_str(self._resolve_node(key)), key, record)
+
+    def _find_path(self, end_node):
+        """
+        Finds the nodes on the path from the root of the tree to end_node.
+
+        Args:
+            end_node (Node): Last node in the path.
+
+        Returns:
+            [Node]: Nodes in the path, starting with end_node
+        """
         path = [end_node]
         current_node = end_node.parent
         while current_node != self.root.parent:
             path.append(current_node)
             current_node = current_node.parent
-        self._execute(path=path)
+        return path
 
     def get_nodes_by_tag(self, tag):
         """
-        Finds all the nodes in the tree with a tag equal to the input tag.
+        Finds all the nodes in the tree with a tag equal to the input tag, in the order they were added to the tree.
         Calls self._get_nodes()
 
         Args:
@@ -178,7 +1015,7 @@ class TransformationTree:
 
     def get_nodes_by_operator(self, operator):
         """
-        Finds all nodes in the tree containing the input operator function (operator).
+        Finds all nodes in the tree containing the input operator function (operator), in the order they were added to the tree.
 
         Args:
             operator (function): function to find
@@ -192,6 +1029,7 @@ class TransformationTree:
         """ 
         Generic tree search method that finds Nodes in the tree with a given value.
         Used by self.get_nodes_by_tag and self.get_nodes_by_operator.
+        Looks the value up in the indexes kept by the methods editing the tree, so nodes must be edited through them.
 
         Positional arguments:
         value -- the value the function checks for
@@ -199,20 +1037,8 @@ class TransformationTree:
 
         Return list of Node objects
         """
-        result = []
-        q = Queue()
-        q.put(self.root)
-        while not q.empty():
-            node = q.get()
-            if mode == "tag":
-                if node.tag == value:
-                    result.append(node)
-            elif mode == "operator":
-                if node.operator == value:
-                    result.append(node)
-            for child in node.children:
-                q.put(child)
-        return result
+        index = self._tag_index if mode == "tag" else self._operator_index
+        return list(index.get(value, ()))
 
     def add_operator(self, operator, args, parent_node, tag="", save_result=False):
         """
@@ -234,10 +1060,11 @@ class TransformationTree:
         """
         new_node = Node(operator, args, parent=parent_node, tag=tag, save_result=save_result)
         
-        if not self._check_compatibility(parent_node, new_node):
+        if not self._check_compatibility(new_node, parent_node):
             raise CompatibilityError()
         
-        parent_node.children.append(new_node)
+        parent_node.add_child(new_node)
+        self._index_subtree(new_node)
         return new_node
 
     def replace_operator(self, operator,args, node, tag="", save_result=False):
@@ -266,10 +1093,14 @@ class TransformationTree:
             # Transferring children to new_node
             for child in node.children:
                 child.parent = new_node
-                new_node.children.append(child)
+                new_node.add_child(child)
             node.parent.children.remove(node)
+            self._unindex_node(node)
+            # The moved children now take their keys from new_node
+            self._index_subtree(new_node)
         else:
             node.parent.children.remove(new_node)
+            self._unindex_node(new_node)
         return new_node
     
 
@@ -295,7 +1126,8 @@ class TransformationTree:
         self._modify_tags(replicated, tag_modifier)
         subtree.parent = parent_node
         replicated.parent = parent_node
-        parent_node.children.append(replicated)
+        parent_node.add_child(replicated)
+        self._index_subtree(replicated)
         # Return reference to replica subtree
         return replicated
 
@@ -317,11 +1149,12 @@ class TransformationTree:
                 raise Exception('Root node reached without finding start node, replicate_path() aborted')
             new_node = self._copy_node(current_node)
             replica.parent = new_node
-            new_node.children.append(replica)
+            new_node.add_child(replica)
             replica = new_node
             current_node = current_node.parent
-        start_node.parent.children.append(replica)
+        start_node.parent.add_child(replica)
         replica.parent = start_node.parent
+        self._index_subtree(replica)
         return replica
 
     def _copy_node(self, node):
@@ -346,14 +1179,12 @@ class TransformationTree:
             subtree_root (Node): Node at the root of the subtree
             modifier (str): String to be appended to modified tags
         """
-        q = Queue()
-        q.put(subtree_root)
-        while not q.empty():
-            node = q.get()
+        q = deque([subtree_root])
+        while q:
+            node = q.popleft()
             if node.tag:
                 node.tag += modifier
-            for child in node.children:
-                q.put(child)
+            q.extend(node.children)
 
     def _check_compatibility(self, new_node, parent_node):
         """ 
@@ -369,17 +1200,15 @@ class TransformationTree:
             True if the required input matches the expected data types. False otherwise.
         """ 
         required_input_keys = self.input_keys[new_node.operator]
-        branch_key_set = set()
-        current_node = parent_node
-        while current_node != self.root.parent:
-            operator_output_keys = self.output_keys[current_node.operator]
-            for key in operator_output_keys:
-                branch_key_set.add(key)
-            current_node = current_node.parent
-        for key in required_input_keys:
-            if key not in branch_key_set:
-                return False
-        return True
+        branch_key_set = self._key_sets.get(parent_node)
+        if branch_key_set is None:
+            # parent_node isn't part of the tree, so the keys of its branch are collected by walking up from it
+            branch_key_set = set()
+            current_node = parent_node
+            while current_node is not None:
+                branch_key_set.update(self.output_keys[current_node.operator])
+                current_node = current_node.parent
+        return all(key in branch_key_set for key in required_input_keys)
 
     def get_path_str(self, end_node):
         '''
@@ -419,34 +1248,414 @@ class TransformationTree:
         return pip
 
 
+# Marks a cache miss, since None is a valid operator result
+_MISSING = object()
+
+
+class _ExecutionLog:
+    """
+    Collects what happened while (part of) a tree executed, so branches executed in other threads or processes can
+    be merged back. Nodes are identified by keys, tuples of child indices leading from the root to the node.
+    """
+    def __init__(self):
+        # (key, result) pairs of nodes with save_result set
+        self.results = []
+        # (key, exception) pairs of nodes that raised
+        self.errors = []
+        # (key, digest) content addresses of nodes executed with a cache
+        self.digests = []
+        # (key, record) measurements of nodes executed with a profiler
+        self.profile = []
+        # (digest, blob) cache entries computed in a worker process, or None if they were stored directly
+        self.cache_entries = None
+
+    def extend(self, other):
+        """
+        Appends the records of another log to this one.
+
+        Args:
+            other (_ExecutionLog): Log of another part of the tree
+        """
+        self.results.extend(other.results)
+        self.errors.extend(other.errors)
+        self.digests.extend(other.digests)
+        self.profile.extend(other.profile)
+
+
+def _execution_order(record):
+    """
+    Sort key placing (key, value) records in the breadth-first order of a sequential tree execution
+    """
+    return len(record[0]), record[0]
+
+
+def _grid_args(node, grid):
+    """
+    Expands a parameter grid lazily.
+
+    Args:
+        node (Node): Node whose args are varied.
+        grid (dict): Maps positions in node.args to lists of values.
+
+    Yields:
+        list: node.args with the values of one combination, for every combination of the grid
+    """
+    positions = list(grid)
+    for values in itertools.product(*(grid[position] for position in positions)):
+        args = list(node.args)
+        for position, value in zip(positions, values):
+            args[position] = value
+        yield args
+
+
+def _subsample(value, budget):
+    """
+    Takes every (1 / budget)-th row of a value, ending with its last row. Unlike the last rows alone, the subsample
+    covers the whole period of the value, so branches are ranked on the same kind of data they're finally trained on.
+
+    Args:
+        value: Array, DataFrame or list
+        budget (float): Fraction of the rows to keep.
+
+    Returns:
+        The subsampled rows of value, a view for arrays
+    """
+    step = max(int(round(1 / budget)), 1)
+    if hasattr(value, "iloc"):
+        return value.iloc[::-step].iloc[::-1]
+    return value[::-step][::-1]
+
+
+def _execute_remote(task):
+    """
+    Executes a subtree submitted by TransformationTree._submit_remote, in a worker process.
+
+    Args:
+        task (bytes): The pickled subtree, its branch dictionary and the settings of its tree.
+
+    Returns:
+        _ExecutionLog: What happened while the subtree executed
+    """
+    settings, node, branch_dict, key, path, start_args, entries = _SubtreeUnpickler(io.BytesIO(task)).load()
+    tree = TransformationTree.__new__(TransformationTree)
+    tree.__dict__.update(settings)
+    return tree._execute_subtree(node, branch_dict, key, path, True, start_args, entries)
+
+
+class _SubtreePickler(pickle.Pickler):
+    """
+    Pickles a subtree without the nodes above it, by pickling the parent of its root as a reference that
+    _SubtreeUnpickler loads as None.
+    """
+    def __init__(self, file, parent):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._parent = parent
+
+    def persistent_id(self, obj):
+        if obj is self._parent and obj is not None:
+            return "parent"
+        return None
+
+
+class _SubtreeUnpickler(pickle.Unpickler):
+    """
+    Loads a subtree pickled by _SubtreePickler, whose root has no parent.
+    """
+    def persistent_load(self, pid):
+        return None
+
+
+def _future_log(key, future):
+    """
+    Args:
+        key (tuple): Child indices leading from the root to the node the future executed.
+        future (Future): Future of the _ExecutionLog of a subtree, see _execute_subtree and _execute_remote.
+
+    Returns:
+        _ExecutionLog: The future's log, or a log holding the error if the worker itself failed
+    """
+    try:
+        return future.result()
+    except Exception as error:
+        log = _ExecutionLog()
+        log.errors.append((key, error))
+        return log
+
+
+def make_executor(executor, max_workers):
+    """
+    Creates the pool used for parallel execution, by the tree and by other modules running work on a pool
+    (e.g. backtesting.backtest).
+
+    Args:
+        executor (str or Executor): "thread", "process" or an existing concurrent.futures.Executor
+        max_workers (int): Number of workers in a newly created pool
+
+    Returns:
+        tuple: (Executor, bool) the pool and whether it was created here and must be shut down by the caller
+    """
+    if isinstance(executor, Executor):
+        return executor, False
+    if executor == "thread":
+        return ThreadPoolExecutor(max_workers=max_workers), True
+    if executor == "process":
+        return ProcessPoolExecutor(max_workers=max_workers), True
+    raise ValueError(f"Unknown executor {executor!r}, expected 'thread', 'process' or an Executor")
+
+
+# Attributes of a TransformationTree that are derived from its nodes, see TransformationTree._rebuild_indexes
+_INDEX_ATTRIBUTES = ("_tag_index", "_operator_index", "_key_sets", "_key_set_pool")
+
+# Attributes of a TransformationTree that aren't sent to worker processes with a subtree, see
+# TransformationTree._submit_remote
+_LOCAL_ATTRIBUTES = ("root", "results", "errors", "node_digests") + _INDEX_ATTRIBUTES
+
+# Identifies files written by save, as opposed to whole objects pickled by older versions
+_FORMAT = ("TransformationTree", 1)
+
+
 # Save works for both trees and pipelines so we use the argument name 'object'
-def save(object, filename):
+def save(object, filename, results=True, blob_dir=None):
     '''
-    Saves a TimeSeries or Pipeline object to a file.
+    Saves a TransformationTree or Pipeline object to a file. Trees are stored as flat lists with one entry per node
+    (operator id, parent index, tag, args, save_result) rather than as linked Node objects, and operators are stored by
+    name in a single table shared with the key dicts. The tree's cache settings are saved, but not its profiler or the
+    digests of its last execution. Any other object is pickled as it is.
+
+    ARGS:
+        object: TransformationTree or Pipeline to save
+        filename: name of the output file
+        results: whether the saved results of the last execution (and a Pipeline's push state) are saved too.
+                 Default True.
+        blob_dir: optional directory where every result is written to its own file instead of the output file. load
+                  then only reads a result when it's accessed. The file names are unique to each save, so several
+                  saved trees can share a directory. Default None (results are stored in the output file).
 
     RETURNS:
         status: a boolean value to determine if the save worked properly
     '''
     try:
-        pickle.dump(object, open(filename, 'wb'))
+        if isinstance(object, (TransformationTree, Pipeline)):
+            object = _flatten(object, filename, results, blob_dir)
+        # Pickling before opening the file keeps a failed save from overwriting it with a partial object
+        data = pickle.dumps(object, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(filename, 'wb') as file:
+            file.write(data)
         status = True
-    except:
+    except (OSError, pickle.PicklingError, AttributeError, TypeError):
+        # Files that can't be written and values that can't be pickled (e.g. lambda operators or args)
         status = False
     return status
 
 # Load works for both trees and pipelines so we use the variable name 'loaded_object'
 def load(filename):
     '''
-    Loads a TimeSeries or Pipeline object to a file.
+    Loads a TransformationTree or Pipeline object from a file written by save. Files holding a whole pickled
+    object, like the ones written by older versions, are loaded as they are.
 
     RETURNS:
-        status: a boolean value to determine if the save worked properly
+        loaded_object: the loaded object, or False if the file couldn't be read
+
+    RAISES:
+        ImportError, AttributeError: if an operator of the saved tree no longer exists
     '''
     try:
-        loaded_object = pickle.load(open(filename, 'rb'))
-        return loaded_object
-    except:
+        with open(filename, 'rb') as file:
+            loaded_object = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
         return False
+    if isinstance(loaded_object, dict) and loaded_object.get("format") == _FORMAT:
+        loaded_object = _unflatten(loaded_object, filename)
+    return loaded_object
+
+
+def _flatten(object, filename, results, blob_dir):
+    '''
+    Converts a TransformationTree or Pipeline into the flat dict written by save.
+    '''
+    pipeline = object if isinstance(object, Pipeline) else None
+    tree = pipeline.tree if pipeline is not None else object
+    operators = []
+    operator_ids = {}
+
+    def operator_id(operator):
+        if operator not in operator_ids:
+            operator_ids[operator] = len(operators)
+            operators.append(_operator_reference(operator))
+        return operator_ids[operator]
+
+    # Nodes are listed in preorder, so a node's parent and older siblings come before it
+    nodes = []
+    stack = [tree.root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(reversed(node.children))
+    indices = {id(node): index for index, node in enumerate(nodes)}
+
+    flat = {
+        "format": _FORMAT,
+        # Filled by operator_id while the other fields are built
+        "operators": operators,
+        "operator": [operator_id(node.operator) for node in nodes],
+        "parent": [indices[id(node.parent)] if node.parent is not None else -1 for node in nodes],
+        "tag": [node.tag for node in nodes],
+        "args": [node.args for node in nodes],
+        "save_result": [node.save_result for node in nodes],
+        "input_keys": {operator_id(operator): keys for operator, keys in tree.input_keys.items()},
+        "output_keys": {operator_id(operator): keys for operator, keys in tree.output_keys.items()},
+        "inplace_keys": {operator_id(operator): keys for operator, keys in tree.inplace_keys.items()},
+        "budget_keys": {operator_id(operator): keys for operator, keys in tree.budget_keys.items()},
+        "io_operators": [operator_id(operator) for operator in tree.io_operators],
+        "update_functions": {operator_id(operator): (operator_id(function), keys)
+                             for operator, (function, keys) in tree.update_functions.items()},
+        "window_keys": {operator_id(operator): keys for operator, keys in tree.window_keys.items()},
+        "cache": tree.cache,
+        "results": [],
+        "end_node": indices[id(pipeline.end_node)] if pipeline is not None else None,
+        "pipeline_results": None,
+        "histories": None
+    }
+    if not results:
+        return flat
+
+    blobs = []
+    # Names the blobs of this save, so they don't overwrite the blobs of other saves in the same directory
+    blob_prefix = f"{os.path.splitext(os.path.basename(filename))[0]}_{uuid.uuid4().hex}"
+
+    def store(pairs):
+        stored = []
+        for result, node in pairs:
+            if blob_dir is not None:
+                blob_path = os.path.join(blob_dir, f"{blob_prefix}_result_{len(blobs)}.pkl")
+                with open(blob_path, 'wb') as file:
+                    pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+                # Blobs are found relative to the saved file, so the two can be moved together
+                result = _Blob(os.path.relpath(blob_path, os.path.dirname(os.path.abspath(filename))))
+                blobs.append(result)
+            stored.append((indices[id(node)], result))
+        return stored
+
+    if blob_dir is not None:
+        os.makedirs(blob_dir, exist_ok=True)
+    flat["results"] = store(tree.results)
+    if pipeline is not None:
+        # After run_path a pipeline's results are the tree's, which are only stored once
+        if pipeline.results is not None and pipeline.results is not tree.results:
+            flat["pipeline_results"] = store(pipeline.results)
+        if pipeline.histories is not None:
+            # The state of the nodes for Pipeline.push
+            flat["histories"] = [{indices[id(node)]: value for node, value in state.items()}
+                                 for state in (pipeline.histories, pipeline.windows, pipeline.models)]
+    return flat
+
+
+def _unflatten(flat, filename):
+    '''
+    Rebuilds the TransformationTree or Pipeline stored in a flat dict written by save.
+    '''
+    operators = [_resolve_operator(reference) for reference in flat["operators"]]
+
+    def key_dict(ids):
+        return {operators[operator_id]: keys for operator_id, keys in ids.items()}
+
+    tree = TransformationTree(key_dict(flat["input_keys"]), key_dict(flat["output_keys"]),
+                              key_dict(flat["inplace_keys"]), [operators[operator_id] for operator_id in flat["io_operators"]],
+                              key_dict(flat["budget_keys"]),
+                              # Files saved before the push declarations don't have them
+                              {operators[operator_id]: (operators[function_id], keys)
+                               for operator_id, (function_id, keys) in flat.get("update_functions", {}).items()},
+                              key_dict(flat.get("window_keys", {})))
+    tree.cache = flat["cache"]
+    nodes = []
+    for operator_id, parent_index, tag, args, save_result in zip(flat["operator"], flat["parent"], flat["tag"],
+                                                                 flat["args"], flat["save_result"]):
+        if parent_index < 0:
+            node = tree.root
+            node.operator, node.args, node.tag, node.save_result = operators[operator_id], args, tag, save_result
+        else:
+            parent = nodes[parent_index]
+            node = Node(operators[operator_id], args, parent=parent, tag=tag, save_result=save_result)
+            parent.add_child(node)
+        nodes.append(node)
+    tree._rebuild_indexes()
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    tree.results = _LoadedResults([(result, nodes[index]) for index, result in flat["results"]], directory)
+    if flat["end_node"] is None:
+        return tree
+    pipeline = Pipeline(tree, nodes[flat["end_node"]])
+    if flat["pipeline_results"] is not None:
+        pipeline.results = _LoadedResults([(result, nodes[index]) for index, result in flat["pipeline_results"]],
+                                          directory)
+    elif flat["results"]:
+        pipeline.results = tree.results
+    if flat["histories"] is not None:
+        pipeline.histories, pipeline.windows, pipeline.models = [{nodes[index]: value for index, value in state.items()}
+                                                                 for state in flat["histories"]]
+    return pipeline
+
+
+def _operator_reference(operator):
+    '''
+    Returns the (module, qualified name) pair an operator can be imported with, or the operator itself if it can't be
+    imported by name (e.g. a lambda or a function defined inside another function).
+    '''
+    reference = (getattr(operator, "__module__", None), getattr(operator, "__qualname__", None))
+    try:
+        if reference[0] is not None and reference[1] is not None and _resolve_operator(reference) is operator:
+            return reference
+    except (ImportError, AttributeError):
+        pass
+    return operator
+
+
+def _resolve_operator(reference):
+    '''
+    Imports the operator stored by _operator_reference.
+    '''
+    if not isinstance(reference, tuple):
+        return reference
+    module_name, qualified_name = reference
+    operator = importlib.import_module(module_name)
+    for name in qualified_name.split("."):
+        operator = getattr(operator, name)
+    return operator
+
+
+class _Blob:
+    '''
+    Placeholder for a result saved to its own file, see save(..., blob_dir=...).
+    '''
+    def __init__(self, path):
+        # Path of the blob, relative to the directory of the saved tree
+        self.path = path
+
+
+class _LoadedResults(Sequence):
+    '''
+    The (result, node) pairs of a loaded tree. Results saved as blobs are read from their files the first time they're
+    accessed and kept afterwards.
+    '''
+    def __init__(self, pairs, directory):
+        self._pairs = pairs
+        self._directory = directory
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        result, node = self._pairs[index]
+        if isinstance(result, _Blob):
+            with open(os.path.join(self._directory, result.path), 'rb') as file:
+                result = pickle.load(file)
+            self._pairs[index] = (result, node)
+        return result, node
+
+    def __repr__(self):
+        return repr(self._pairs)
 
 
 class Pipeline:
@@ -457,6 +1666,12 @@ class Pipeline:
         self.tree = tree
         self.end_node = pipeline_end_node
         self.results = None
+        # Incremental mode: node -> TimeSeries history of the series entering the node, see self.push
+        self.histories = None
+        # Incremental mode: design matrix node -> last values of its series, needed by the first windows of a push
+        self.windows = None
+        # Incremental mode: node declared in the tree's update_functions (e.g. fit) -> model trained on every pushed row
+        self.models = None
 
     def run_path(self):
         '''
@@ -467,4 +1682,151 @@ class Pipeline:
         '''
         self.tree.execute_path(self.end_node)
         self.results = self.tree.results
+
+    def push(self, rows, key="timeseries_data"):
+        '''
+        Pushes newly appended rows through the pipeline without recomputing its history, and modifies self.results.
+        The first push executes the whole path once to build the state of every node. Then, and on every later push,
+        the nodes up to the one reading the series are skipped and:
+            - every node taking the series before the design matrix gets the new rows appended to its history with
+              TimeSeries.append: scaling, standardize and impute_outliers use the running statistics of all the rows
+              seen so far and difference continues from the previous row. Only the last row and the statistics of each
+              history are kept.
+            - the design matrix node, declared in the tree's window_keys (e.g. ts2db), keeps the last
+              input_index + output_index - 1 values of its series, so it builds every window ending in the new rows,
+              even when fewer rows than a window are pushed. These windows are stored in all of its declared output
+              keys, so they're both the training and the test rows of the nodes below (x_train/y_train and
+              x_test/y_test).
+            - nodes declared in the tree's update_functions (e.g. fit and update) continue training the model trained
+              so far on the new windows with their update function, instead of training a new model on them alone.
+            - the other nodes (e.g. predict and metrics) are executed on what the new rows produced, so metrics score
+              the updated model on the new windows.
+        The tree's cache is bypassed, since the digests of the new rows don't describe their content.
+
+        ARGS:
+            rows: DataFrame of the new rows, with the columns of the series read by the pipeline
+            key: branch dictionary key of the series read by the pipeline. Default "timeseries_data".
+
+        RETURNS:
+            self.results: (result, node) pairs of the path's nodes saving their result, computed from the new rows
+
+        RAISES:
+            ValueError: if no node of the path reads a time series
+        '''
+        path = self.tree._find_path(self.end_node)[::-1]
+        # The source reads the series, e.g. read_from_file: it outputs the series without taking it
+        sources = [index for index, node in enumerate(path)
+                   if key in self.tree.output_keys[node.operator] and key not in self.tree.input_keys[node.operator]]
+        if not sources:
+            raise ValueError("The pipeline doesn't read a time series")
+        if self.histories is None:
+            self.histories, self.windows, self.models = {}, {}, {}
+            self._push_nodes(path, 0, BranchState(), key, incremental=False)
+        branch_dict = BranchState()
+        branch_dict[key] = preprocessing.TimeSeries(rows)
+        self.results = self._push_nodes(path, sources[-1] + 1, branch_dict, key, incremental=True)
+        return self.results
+
+    def _push_nodes(self, path, start, branch_dict, key, incremental):
+        '''
+        Executes path[start:] for self.push.
+
+        ARGS:
+            path: nodes from the root of the tree to self.end_node
+            start: index in path of the first node to execute
+            branch_dict: BranchState holding the values the node at start takes
+            key: branch dictionary key of the series
+            incremental: whether the state of the nodes is already built and branch_dict holds new rows. If False,
+                         the state is built from the values the nodes take.
+
+        RETURNS:
+            (result, node) pairs of the executed nodes saving their result
+        '''
+        log = _ExecutionLog()
+        nodes = set(path)
+        node_key = tuple(parent.children.index(node) for parent, node in zip(path, path[1:]))
+        for index in range(start, len(path)):
+            node = path[index]
+            input_keys = self.tree.input_keys[node.operator]
+            update = self.tree.update_functions.get(node.operator)
+            if key in input_keys and node.operator in self.tree.window_keys:
+                if self._push_windows(node, branch_dict, key, incremental):
+                    continue
+            elif key in input_keys:
+                series = branch_dict[key]
+                if node not in self.histories:
+                    # Starting with an empty history makes the first push go through append like every other one
+                    self.histories[node] = preprocessing.TimeSeries(series.data.iloc[:0]).track_stats()
+                branch_dict[key] = self.histories[node].append(series, keep_history=False)
+            elif update is not None and incremental:
+                update_function, update_keys = update
+                inputs = [branch_dict[input_key] for input_key in update_keys]
+                self.models[node] = update_function(self.models[node], *inputs)
+                branch_dict[self.tree.output_keys[node.operator][0]] = self.models[node]
+                continue
+            children = self.tree._execute_node(node, branch_dict, node_key[:index], nodes, log, use_cache=False)
+            if not children:
+                break
+            branch_dict = children[0][1]
+            if update is not None:
+                self.models[node] = branch_dict[self.tree.output_keys[node.operator][0]]
+        self.tree._record_profile(log)
+        return [(result, self.tree._resolve_node(result_key)) for result_key, result in log.results]
+
+    def _push_windows(self, node, branch_dict, key, incremental):
+        '''
+        Builds the windows of a design matrix node (e.g. ts2db) for self.push. The first push only records the last
+        values of the series, which the node then executes on. Later pushes prepend them to the new values and store
+        every window in the node's window keys instead of executing the node.
+
+        ARGS:
+            node: design matrix node, whose operator takes input_index and output_index (and optionally dtype) args
+            branch_dict: BranchState holding the series the node takes
+            key: branch dictionary key of the series
+            incremental: whether the node's last values are already recorded
+
+        RETURNS:
+            whether the windows were stored, so the node must not be executed
+        '''
+        series = branch_dict[key]
+        bound = inspect.signature(node.operator).bind(series, *node.args).arguments
+        input_index, output_index = bound["input_index"], bound["output_index"]
+        values = series.data[series.data.columns[-1]].to_numpy()
+        if incremental:
+            values = np.concatenate([self.windows[node], values])
+        # The first input_index + output_index - 1 values can't end a window, they're only the context of later ones
+        self.windows[node] = values[len(values) - min(input_index + output_index - 1, len(values)):]
+        if not incremental:
+            return False
+        windows = preprocessing.window_matrices(values, input_index, output_index, bound.get("dtype"))
+        for index, output_key in enumerate(self.tree.window_keys[node.operator]):
+            branch_dict[output_key] = windows[index % 2]
+        return True
+
+
+def run_pipelines(pipelines, executor=None, max_workers=None):
+    '''
+    Executes many Pipeline objects together and modifies the results attribute of each one.
+    Pipelines exported from the same tree are merged into a single execution plan with
+    TransformationTree.execute_paths, so their shared prefix is only executed once.
+
+    ARGS:
+        pipelines: list of Pipeline objects
+        executor: "thread", "process" or a concurrent.futures.Executor used to run the branches, see
+                  TransformationTree.execute_tree. Default None (sequential).
+        max_workers: size of the pool created for executor. Default None.
+
+    RETURNS:
+        pipelines: the same list of Pipeline objects
+    '''
+    # Grouping the pipelines by the tree they were exported from
+    groups = {}
+    for pip in pipelines:
+        groups.setdefault(id(pip.tree), (pip.tree, []))[1].append(pip)
+    for tree, group in groups.values():
+        tree.execute_paths([pip.end_node for pip in group], executor=executor, max_workers=max_workers)
+        for pip in group:
+            path = set(tree._find_path(pip.end_node))
+            pip.results = [(result, node) for result, node in tree.results if node in path]
+    return pipelines
         
@@ -7,6 +7,7 @@ Most recent modification: 2/9/21
 '''
 
 import matplotlib.pyplot as plt
+import numpy as np
 from preprocessing import TimeSeries
 from typing import List
 from scipy.stats import shapiro
@@ -107,108 +108,129 @@ def normality_test(ts: TimeSeries):
     plt.figure()
 
 
-def mse(y_test: List, y_forecast: List) -> float:
+def _as_arrays(y_test, y_forecast):
     '''
-    Computes the Mean Squared Error (MSE) error of two time series.
+    Converts the actual and forecast data to float arrays of the same shape. A forecast with the same number of
+    elements but a different shape (e.g. sklearn's (n,) predictions against (n, 1) test rows) is reshaped to match.
 
     RETURNS:
-        - the MSE as a float
+        - y_test and y_forecast as NumPy arrays
+    '''
+    y_test = np.asarray(y_test, dtype=float)
+    y_forecast = np.asarray(y_forecast, dtype=float)
+    if y_test.shape != y_forecast.shape and y_test.size == y_forecast.size:
+        y_forecast = y_forecast.reshape(y_test.shape)
+    return y_test, y_forecast
 
-    ARGS:
-        - y_test: the time series data being tested (represented as a list)
-        - y_forecast: our forecasting model data (represented as a list)
-    '''
-    # Initialize a result variable
-    
-    result = 0
-
-    # Calculate n
-    n = len(y_forecast)
-    # Loop through every data point in y_forecast and y_test
-    for i in range(n):
-        # Compute the difference between the actual data and our forecasting model
-        diff = y_test[i] - y_forecast[i]
-        # Square the difference and add it to result
-        result += (diff ** 2)
-
-    # Final multiplication step
-    result *= (1 / n)
-    if len(result) == 1:
-        result = result[0]
+
+def _safe_divide(numerator, denominator):
+    '''
+    Divides two arrays elementwise. Terms with a zero denominator are always 0, so the percentage errors never raise
+    or produce inf/nan.
+    '''
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape),
+                     where=denominator != 0)
+
+
+def _squared_errors(y_test, y_forecast):
+    return (y_test - y_forecast) ** 2
+
+
+def _absolute_percentage_errors(y_test, y_forecast):
+    return np.abs(_safe_divide(y_test - y_forecast, y_test)) * 100
+
+
+def _symmetric_percentage_errors(y_test, y_forecast):
+    return _safe_divide(np.abs(y_test - y_forecast), np.abs(y_test) + np.abs(y_forecast)) * 100
+
+
+def _mean_error(errors, axis):
+    result = errors.mean(axis=axis)
+    if np.ndim(result) == 0:
+        result = float(result)
     return result
 
 
-def mape(y_test: List, y_forecast: List) -> float:
+def mse(y_test: List, y_forecast: List, axis=None) -> float:
     '''
-    Computes the Mean Absolute Percentage Error (MAPE) error of two time series.
+    Computes the Mean Squared Error (MSE) error of two time series.
 
     RETURNS:
-        - the percentage error as a float
+        - the MSE as a float, or an array of errors when axis is given
 
     ARGS:
-        - y_test: the time series being tested
-        - y_forecast: our forecasting model
+        - y_test: the time series data being tested (list or array, one row per forecast for multi-output data)
+        - y_forecast: our forecasting model data (same number of elements as y_test)
+        - axis: (optional) axis to average over, e.g. 0 for one error per output of a multi-output forecast.
+                Default None (average over everything).
     '''
-    # Initialize a result variable
-    result = 0
-
-    # Calculate n
-    n = len(y_forecast)
+    y_test, y_forecast = _as_arrays(y_test, y_forecast)
+    return _mean_error(_squared_errors(y_test, y_forecast), axis)
 
-    # Loop through every data point in y_forecast and y_test
-    for i in range(n):
-        # Compute the difference between the actual data and our forecasting model
-        diff = y_test[i] - y_forecast[i]
-        # Calculate the difference divided by the test data
-        inner = diff / y_test[i]
-        # Take the absolute value of the difference divided by the test data and add it to the result
-        result += abs(inner)
 
-    # Final multiplication step
-    result *= (1 / n)
+def mape(y_test: List, y_forecast: List, axis=None) -> float:
+    '''
+    Computes the Mean Absolute Percentage Error (MAPE) error of two time series.
+    Points where y_test is 0 count as 0% error.
 
-    # Convert to percentage
-    result *= 100
+    RETURNS:
+        - the percentage error as a float, or an array of errors when axis is given
 
-    return result
+    ARGS:
+        - y_test: the time series being tested
+        - y_forecast: our forecasting model
+        - axis: (optional) axis to average over. Default None (average over everything).
+    '''
+    y_test, y_forecast = _as_arrays(y_test, y_forecast)
+    return _mean_error(_absolute_percentage_errors(y_test, y_forecast), axis)
 
 
-def smape(y_test: List, y_forecast: List) -> float:
+def smape(y_test: List, y_forecast: List, axis=None) -> float:
     '''
     Computes the Symmetric Mean Absolute Percentage Error (SMAPE) error of two time series.
+    Points where both y_test and y_forecast are 0 count as 0% error.
 
     RETURNS:
-        - the percentage error as a float
+        - the percentage error as a float, or an array of errors when axis is given
 
     ARGS:
         - y_test: the time series being tested
         - y_forecast: our forecasting model
+        - axis: (optional) axis to average over. Default None (average over everything).
     '''
-    # Initialize a result variable
-    result = 0
-
-    # Calculate n
-    n = len(y_forecast)
+    y_test, y_forecast = _as_arrays(y_test, y_forecast)
+    return _mean_error(_symmetric_percentage_errors(y_test, y_forecast), axis)
 
-    # Loop through every data point in y_forecast and y_test
-    for i in range(n):
-        # Compute the numerator of the SMAPE formula
-        numerator = abs(y_test[i] - y_forecast[i])
 
-        # Compute the absolute value of the test and forecast data for computational purposes
-        test_data = abs(y_test[i])
-        forecast_data = abs(y_forecast[i])
+# Elementwise error of each metric, used to score batches in a single vectorized pass
+_metric_errors = {
+    mse: _squared_errors,
+    mape: _absolute_percentage_errors,
+    smape: _symmetric_percentage_errors
+}
 
-        # Compute the denominator of the SMAPE formula
-        denominator = test_data + forecast_data
 
-        # Add the inner part of the sum to the result
-        result += (numerator / denominator)
-
-    # Final multiplication step
-    result *= (1 / n)
+def score_batch(metric, y_tests, y_forecasts):
+    '''
+    Scores many forecasts with the same metric in one call.
 
-    # Convert to percentage
-    result *= 100
+    RETURNS:
+        - a NumPy array holding one error per (y_test, y_forecast) pair
 
-    return result
+    ARGS:
+        - metric: mse, mape or smape (any function taking y_test and y_forecast also works, one pair at a time)
+        - y_tests: sequence of the time series being tested
+        - y_forecasts: sequence of the matching forecasts
+    '''
+    if len(y_tests) != len(y_forecasts):
+        raise ValueError(f"Got {len(y_tests)} test series but {len(y_forecasts)} forecasts")
+    if len(y_tests) == 0:
+        return np.empty(0)
+    pairs = [_as_arrays(y_test, y_forecast) for y_test, y_forecast in zip(y_tests, y_forecasts)]
+    shapes = {y_test.shape for y_test, _ in pairs}
+    if metric in _metric_errors and len(shapes) == 1:
+        # Every pair has the same shape, so the whole batch is scored as one array
+        errors = _metric_errors[metric](np.stack([y_test for y_test, _ in pairs]),
+                                        np.stack([y_forecast for _, y_forecast in pairs]))
+        return errors.reshape(len(pairs), -1).mean(axis=1)
+    return np.array([metric(y_test, y_forecast) for y_test, y_forecast in pairs], dtype=float)